@@ -1,65 +1,162 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, Blueprint, current_app, render_template, request, redirect, url_for, flash, session, jsonify, Response, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SubmitField, TextAreaField
-from flask_session import Session
 from wtforms.validators import DataRequired, Length
-from werkzeug.security import generate_password_hash, check_password_hash
-from utils import generate_project_idea, login_required, validate_input
+from utils import generate_project_idea, stream_project_idea, summarize_conversation, estimate_tokens, login_required, validate_input, GENERATION_PARAMS
+from prompt_cache import prompt_cache
+from db_health import db_health
+from jobs import job_queue, JobQueueFull
+from message_log import message_log
+from cold_storage import compactor, compress, decompress
+from cpu_pool import cpu_pool, hash_password, verify_password, render_markdown
+from llm import llm
+from near_cache import NearCachedSession
+from quota import user_quota, Lease, QuotaExceeded
+import metrics
+import http_cache
+import search
+import realtime
 from datetime import datetime, timedelta
 import os
+import json
 import secrets
 import re
-import markdown
 from markupsafe import Markup
-import bleach
+from lazy import lazy_import
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_limiter.errors import RateLimitExceeded
-from flask_migrate import Migrate
-from sqlalchemy import text
+from sqlalchemy import text, func, or_, and_, insert, update, event, cast, LargeBinary
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.exc import OperationalError
 import uuid
+import weakref
 import redis
+import click
 
-ALLOWED_TAGS = bleach.sanitizer.ALLOWED_TAGS.union({
-    'p', 'pre', 'code', 'blockquote', 'ul', 'ol', 'li', 'strong', 'em', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'a'
-})
+bleach = lazy_import("bleach")
 
-ALLOWED_ATTRS = {
-    **bleach.sanitizer.ALLOWED_ATTRIBUTES,
-    "a": ["href", "title", "rel", "target"]
-}
+# Allowed on top of bleach's defaults when rendering assistant markdown
+EXTRA_TAGS = {'p', 'pre', 'code', 'blockquote', 'ul', 'ol', 'li', 'strong', 'em', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'a'}
+EXTRA_ATTRS = {"a": ["href", "title", "rel", "target"]}
+
+db = SQLAlchemy()
+server_session = NearCachedSession()
+limiter = Limiter(get_remote_address, default_limits=["200 per day", "50 per hour"])
+bp = Blueprint("main", __name__, cli_group=None)
+
+def create_app():
+    """Build and configure the Flask app.
+
+    Nothing here opens a connection: the engine, Redis and LLM clients connect
+    on first use, and reset_after_fork() drops anything a preloading parent
+    created, so gunicorn can run several workers with --preload.
+    """
+    app = Flask(__name__)
+
+    # Configuration
+    app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=1)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv("DATABASE_URL")
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SECRET_KEY'] = os.getenv("SECRET_KEY")
+    app.config['SESSION_COOKIE_SECURE'] = os.getenv("FLASK_SECURE_COOKIES", "1") == "1"
+    app.config['SESSION_COOKIE_HTTPONLY'] = True
+    app.config['SESSION_COOKIE_SAMESITE'] = os.getenv("FLASK_SAMESITE", "Lax")
+    app.config['SESSION_TYPE'] = "redis"
+    app.config['SESSION_REDIS'] = redis.from_url(os.getenv("REDIS_URL"))
+    app.config['RATELIMIT_STORAGE_URI'] = os.getenv("REDIS_URL") or "memory://"
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        "pool_pre_ping": os.getenv("DB_POOL_PRE_PING", "1") == "1",
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "280")),
+    }
+    if not (app.config['SQLALCHEMY_DATABASE_URI'] or "").startswith("sqlite"):
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'].update({
+            "pool_size": int(os.getenv("DB_POOL_SIZE", "5")),
+            "max_overflow": int(os.getenv("DB_MAX_OVERFLOW", "10")),
+            "pool_timeout": int(os.getenv("DB_POOL_TIMEOUT", "10")),
+        })
 
-app = Flask(__name__)
+    if not app.config['SECRET_KEY']:
+        raise ValueError("No SECRET_KEY set for Flask application")
 
-# Configuration
-app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=1)
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv("DATABASE_URL")
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SECRET_KEY'] = os.getenv("SECRET_KEY")
-app.config['SESSION_COOKIE_SECURE'] = os.getenv("FLASK_SECURE_COOKIES", "1") == "1"
-app.config['SESSION_COOKIE_HTTPONLY'] = True
-app.config['SESSION_COOKIE_SAMESITE'] = os.getenv("FLASK_SAMESITE", "Lax")
-app.config['SESSION_TYPE'] = "redis"
-app.config["SESSION_REDIS"] = redis.from_url(os.getenv("REDIS_URL"))
+    db.init_app(app)
+    if click.get_current_context(silent=True) is not None:
+        # Only the flask CLI (flask db ...) needs migrations, so alembic stays out of web workers
+        from flask_migrate import Migrate
+        Migrate(app, db)
+    server_session.init_app(app)
+    limiter.init_app(app)
+    metrics.init_app(app)
+    http_cache.init_app(app)
+    realtime.init_app(app)
+    db_health.init_app(app, lambda: db.engine)
+    app.register_blueprint(bp)
 
-if not app.config['SECRET_KEY']:
-    raise ValueError("No SECRET_KEY set for Flask application")
+    job_queue.handler = lambda payload: run_generation_job(app, payload)
+    message_log.flush_fn = lambda entries: flush_logged_messages(app, entries)
+    compactor.compact_fn = lambda before, batch_size, min_bytes: compact_old_messages(app, before, batch_size, min_bytes)
+    forked_apps.add(app)
+    return app
 
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
-Session(app)
+# Apps whose connections a forked worker must reopen; weak so discarded apps drop out
+forked_apps = weakref.WeakSet()
 
-@app.before_request
-def warm_db():
+def reset_after_fork():
+    """Forget connections inherited from the parent so each worker opens its own."""
+    for app in list(forked_apps):
+        with app.app_context():
+            for engine in db.engines.values():
+                # close=False leaves the parent's sockets alone instead of shutting them under it
+                engine.dispose(close=False)
+        app.config['SESSION_REDIS'].connection_pool.reset()
+    llm.reset()
+
+# Registered once at import, not per create_app(), so hooks don't pile up
+os.register_at_fork(after_in_child=reset_after_fork)
+
+# Routes that never touch the database keep working while it is down
+DB_FREE_ENDPOINTS = {'static', 'main.index', 'main.health', 'main.metrics_endpoint'}
+
+@bp.before_app_request
+def check_db_health():
     if request.endpoint in ('static', None) or request.path == '/favicon.ico':
         return
-    
-    try:
-        db.session.execute(text("SELECT 1"))
-    except OperationalError:
-        app.logger.warning("Database is waking up or unreachable")
+
+    db_health.ensure_started()
+    message_log.ensure_started()
+    compactor.ensure_started()
+    if request.endpoint in DB_FREE_ENDPOINTS or db_health.healthy:
+        return
+    return database_unavailable()
+
+def database_unavailable():
+    message = "Our database is waking up. Please try again in a few seconds."
+    if wants_html():
+        # The view's own "just woke up" flash may already be waiting to be shown
+        if not any(category == "warning" for category, _ in session.get("_flashes", [])):
+            flash(message, "warning")
+        response = current_app.make_response(render_template("index.html"))
+    else:
+        response = jsonify({"error": message})
+    response.status_code = 503
+    response.headers["Retry-After"] = str(max(1, int(db_health.retry_interval)))
+    return response
+
+def wants_html():
+    """True for page loads and form posts, as opposed to the fetch() calls of the chat UI."""
+    if request.is_json:
+        return False
+    return request.accept_mimetypes.best_match(["application/json", "text/html"]) == "text/html"
+
+@bp.app_errorhandler(OperationalError)
+def operational_error_handler(e):
+    db.session.rollback()
+    # Locks, deadlocks, timeouts and schema errors are the query's own failure, not an outage
+    if not db_health.report_failure(e):
+        raise e
+    current_app.logger.warning("Database is waking up or unreachable")
+    return database_unavailable()
 
 # Forms
 class RegisterForm(FlaskForm):
@@ -101,8 +198,21 @@ class ProjectIdea(db.Model):
     topic = db.Column(db.String(100), nullable=False)
     content = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.now)
+    # Bumped on every ORM update (rename, auto-title, summary); part of the HTTP cache validators
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now, nullable=True)
+    summary = db.Column(db.Text, nullable=True)
+    summary_until_id = db.Column(db.Integer, nullable=True)
     chat_messages = db.relationship("ChatMessage", backref="project", lazy=True, cascade="all, delete-orphan")
 
+    __table_args__ = (
+        # Sidebar listing: a user's visible projects, newest first
+        db.Index(
+            "ix_project_idea_user_timestamp", "user_id", "timestamp", "id",
+            postgresql_where=text("public_id IS NOT NULL"),
+            sqlite_where=text("public_id IS NOT NULL")
+        ),
+    )
+
     def __repr__(self):
         return f"Project Idea: {self.topic}"
     
@@ -112,22 +222,558 @@ class ChatMessage(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
     role = db.Column(db.String(10), nullable=False)
     content = db.Column(db.Text, nullable=False)
+    html = db.Column(db.Text, nullable=True)
     timestamp = db.Column(db.DateTime, default=datetime.now)
+    # Set for rows written through the write-behind log so replays stay idempotent
+    log_id = db.Column(db.String(32), nullable=True, unique=True)
+    # Cold storage: compacted rows keep zlib-compressed content/html here and an empty content column
+    content_z = db.Column(db.LargeBinary, nullable=True)
+    html_z = db.Column(db.LargeBinary, nullable=True)
 
+    __table_args__ = (
+        # Conversation pages are keyed on message id within a user's project
+        db.Index("ix_chat_message_user_project_id", "user_id", "project_id", "id"),
+        # A user's newest message, for the /history validator
+        db.Index("ix_chat_message_user_id", "user_id", "id"),
+        # Messages not yet compacted, oldest first, so compaction never scans cold rows
+        db.Index(
+            "ix_chat_message_uncompacted", "timestamp", "id",
+            postgresql_where=text("content_z IS NULL"),
+            sqlite_where=text("content_z IS NULL")
+        ),
+    )
 
-REDIS_URL = os.getenv("REDIS_URL")
-if REDIS_URL:
-    app.config["SESSION_REDIS"] = redis.from_url(REDIS_URL)
-    
-limiter = Limiter(get_remote_address, app=app, default_limits=["200 per day", "50 per hour"], storage_uri=REDIS_URL if REDIS_URL else "memory://")
+@event.listens_for(ChatMessage, "load")
+@event.listens_for(ChatMessage, "refresh")
+def decompress_cold_message(target, context, attrs=None):
+    """Expose compacted messages' content and html as if they were never compressed."""
+    # Read from __dict__ so a partial refresh never triggers another load
+    content_z = target.__dict__.get("content_z")
+    if content_z is not None:
+        html_z = target.__dict__.get("html_z")
+        set_committed_value(target, "content", decompress(content_z))
+        set_committed_value(target, "html", decompress(html_z) if html_z is not None else None)
+
+def message_content(content, content_z):
+    """Content of a message selected as plain columns rather than loaded as a ChatMessage."""
+    return decompress(content_z) if content_z is not None else content
 
-@app.errorhandler(RateLimitExceeded)
+
+@bp.app_errorhandler(RateLimitExceeded)
 def ratelimit_handler(e):
     return jsonify({
         "error": "Too many requests. Please slow down",
         "message": str(e.description)
     }), 429
 
+@bp.app_errorhandler(QuotaExceeded)
+def quota_exceeded_handler(e):
+    if e.reason == "budget":
+        message = "You have used your generation budget for now."
+    else:
+        message = "You already have replies being generated."
+    response = jsonify({"error": f"{message} Please try again in {e.retry_after} seconds.", "reason": e.reason})
+    response.status_code = 429
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
+def add_message(user_id, project_id, role, content, html=None):
+    """Record a chat message, through the write-behind log when it is enabled."""
+    if message_log.enabled:
+        return message_log.append(user_id, project_id, role, content, html)
+    msg = ChatMessage(user_id=user_id, project_id=project_id, role=role, content=content, html=html)
+    db.session.add(msg)
+    return msg
+
+def discard_message(msg):
+    """Take back a stored message whose turn could not be started, so resending it does not duplicate it."""
+    if message_log.enabled:
+        message_log.discard(msg)
+        # The flusher may already have written it
+        ChatMessage.query.filter_by(log_id=msg.log_id).delete()
+    else:
+        db.session.delete(msg)
+    db.session.commit()
+
+def flush_logged_messages(app, entries):
+    """Bulk-insert a batch from the write-behind log, skipping rows already written."""
+    with app.app_context():
+        log_ids = [entry["log_id"] for entry in entries]
+        written = {row[0] for row in db.session.query(ChatMessage.log_id).filter(ChatMessage.log_id.in_(log_ids))}
+        project_ids = {entry["project_id"] for entry in entries}
+        # Messages for projects deleted before the flush are dropped rather than blocking the log
+        live = {row[0] for row in db.session.query(ProjectIdea.id).filter(ProjectIdea.id.in_(project_ids))}
+        rows = [{
+            "user_id": entry["user_id"],
+            "project_id": entry["project_id"],
+            "role": entry["role"],
+            "content": entry["content"],
+            "html": entry["html"],
+            "timestamp": datetime.fromisoformat(entry["timestamp"]),
+            "log_id": entry["log_id"]
+        } for entry in entries if entry["log_id"] not in written and entry["project_id"] in live]
+        if rows:
+            db.session.execute(insert(ChatMessage), rows)
+        db.session.commit()
+
+def byte_length(column):
+    """SQL expression for the UTF-8 size of a text column; length() counts characters."""
+    if db.engine.dialect.name == "sqlite":
+        return func.length(cast(column, LargeBinary))
+    return func.octet_length(column)
+
+def compact_old_messages(app, before, batch_size, min_bytes):
+    """Compress one batch of messages older than ``before``; returns (rows, bytes before, bytes after)."""
+    with app.app_context():
+        # SKIP LOCKED lets several web processes compact at once without colliding (Postgres only)
+        rows = db.session.execute(
+            db.select(ChatMessage.id, ChatMessage.content, ChatMessage.html)
+            .where(ChatMessage.content_z.is_(None), ChatMessage.timestamp < before, byte_length(ChatMessage.content) >= min_bytes)
+            .order_by(ChatMessage.timestamp, ChatMessage.id)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        ).all()
+        if not rows:
+            db.session.rollback()
+            return 0, 0, 0
+        changes = []
+        bytes_before = bytes_after = 0
+        for row in rows:
+            content_z = compress(row.content)
+            html_z = compress(row.html) if row.html is not None else None
+            bytes_before += len(row.content.encode("utf-8")) + len((row.html or "").encode("utf-8"))
+            bytes_after += len(content_z) + len(html_z or b"")
+            changes.append({"id": row.id, "content": "", "html": None, "content_z": content_z, "html_z": html_z})
+        db.session.execute(update(ChatMessage), changes)
+        db.session.commit()
+        return len(rows), bytes_before, bytes_after
+
+def save_assistant_reply(user_id, project, ai_reply, skip_sid=None):
+    topic = project.topic
+    ai_msg = add_message(user_id, project.id, "assistant", ai_reply, render_message_html(ai_reply))
+    apply_auto_title(project, ai_reply)
+    db.session.commit()
+    if project.topic != topic:
+        realtime.publish(user_id, "project_updated", project_event(project), skip_sid)
+    publish_message(user_id, project, ai_msg, skip_sid)
+    return ai_msg
+
+def project_event(project):
+    return {
+        "public_id": project.public_id,
+        "topic": project.topic,
+        "timestamp": project.timestamp.strftime("%Y-%m-%d %H:%M")
+    }
+
+def publish_message(user_id, project, msg, skip_sid=None):
+    realtime.publish(user_id, "message_created", {"project_id": project.public_id, "message": serialize_message(msg)}, skip_sid)
+
+def generation_cost(message_text):
+    """Tokens reserved for a turn before its context is built: the most the context, new message and reply can use."""
+    return CONTEXT_TOKEN_BUDGET + estimate_tokens(message_text) + GENERATION_PARAMS["max_tokens"]
+
+def tokens_used(messages, reply):
+    return sum(estimate_tokens(msg["content"]) for msg in messages) + estimate_tokens(reply)
+
+def run_generation_job(app, payload):
+    """Generate and store the assistant reply for a queued /chat turn."""
+    # The web request took the user's quota slot; it is given back once the reply is stored
+    lease = Lease(**payload["lease"]) if payload.get("lease") else None
+    # Nothing is charged for a job that fails before the LLM answers
+    used = 0
+    try:
+        with app.app_context():
+            user_id = payload["user_id"]
+            project = db.session.get(ProjectIdea, payload["project_id"])
+            if not project or project.user_id != user_id:
+                raise ValueError("Project not found")
+
+            messages_for_llm = build_llm_context(user_id, project)
+            ai_reply = generate_project_idea(messages_for_llm, use_cache=not payload.get("fresh", False))
+            used = tokens_used(messages_for_llm, ai_reply)
+            ai_msg = save_assistant_reply(user_id, project, ai_reply, skip_sid=payload.get("socket_id"))
+            user_quota.release(lease, used)
+            lease = None
+            result = {
+                "reply": ai_reply,
+                "project_title": project.topic,
+                "project_id": project.public_id,
+                "message": serialize_message(ai_msg)
+            }
+            try:
+                refresh_summary(user_id, project.id)
+            except Exception as e:
+                db.session.rollback()
+                app.logger.warning(f"Could not refresh conversation summary: {e}")
+            return result
+    finally:
+        user_quota.release(lease, used)
+
+def apply_auto_title(project, ai_reply):
+    if not project.topic.startswith("Untitled Project"):
+        return
+
+    title = None
+    for line in ai_reply.splitlines():
+        if "Project Title:" in line:
+            title = line.replace("Project Title:", "").strip()
+            break
+    if not title:
+        title = ai_reply.split("\n")[0][25:50]
+
+    if title:
+        title = re.sub(r"[*_`]+", "", title).strip()
+
+    project.topic = title or "AI Project"
+
+MESSAGE_PAGE_SIZE = 50
+# /generate server-renders only the newest turns; the browser loads older ones as the reader scrolls up
+FIRST_PAINT_MESSAGES = int(os.getenv("FIRST_PAINT_MESSAGES", "20"))
+CONTEXT_MAX_MESSAGES = int(os.getenv("CONTEXT_MAX_MESSAGES", "20"))
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+SUMMARY_BATCH_SIZE = 20
+# Messages that must slide out of the window before the summary is refreshed, so it is not one LLM call per turn
+SUMMARY_MIN_MESSAGES = int(os.getenv("SUMMARY_MIN_MESSAGES", "6"))
+
+def serialize_message(msg):
+    data = {
+        "id": msg.id,
+        "role": msg.role,
+        "content": msg.content,
+        "timestamp": msg.timestamp.strftime("%Y-%m-%d %H:%M")
+    }
+    if msg.html:
+        data["html"] = msg.html
+    if msg.log_id:
+        # Lets the client swap a write-behind message for its row once flushed
+        data["log_id"] = msg.log_id
+    if msg.id is None:
+        data["pending"] = True
+    return data
+
+def message_page(user_id, project_id, after=None, before=None, limit=MESSAGE_PAGE_SIZE):
+    """Return one page of messages in chronological order and whether more exist.
+
+    With ``after`` the page holds the oldest messages newer than that id,
+    otherwise it holds the newest messages older than ``before`` (or the
+    newest overall). Message ids are the cursor because timestamps can tie.
+    Messages still waiting in the write-behind log are newer than every
+    stored row, so they are appended to any page that reaches the end.
+    """
+    # Snapshot the log before querying so a flush in between cannot hide a message
+    pending = message_log.pending(user_id, project_id) if message_log.enabled and before is None else []
+    query = ChatMessage.query.filter_by(user_id=user_id, project_id=project_id)
+    if after is not None:
+        rows = query.filter(ChatMessage.id > after).order_by(ChatMessage.id.asc()).limit(limit + 1).all()
+        if len(rows) <= limit:
+            rows = rows + unflushed(pending, rows)
+        return rows[:limit], len(rows) > limit
+
+    if before is not None:
+        query = query.filter(ChatMessage.id < before)
+    rows = query.order_by(ChatMessage.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = list(reversed(rows[:limit])) + unflushed(pending, rows)
+    return rows[-limit:], has_more or len(rows) > limit
+
+def unflushed(pending, rows):
+    # An entry is briefly both stored and still in the log while a flush completes
+    stored = {msg.log_id for msg in rows if msg.log_id}
+    return [msg for msg in pending if msg.log_id not in stored]
+
+def context_window(user_id, project):
+    """Return the newest messages that fit the token budget left after the summary."""
+    rows, _ = message_page(user_id, project.id, limit=CONTEXT_MAX_MESSAGES)
+    budget = CONTEXT_TOKEN_BUDGET - (estimate_tokens(project.summary) if project.summary else 0)
+
+    window = []
+    used = 0
+    for msg in reversed(rows):
+        cost = estimate_tokens(msg.content)
+        # The newest message always goes in, however long it is
+        if window and used + cost > budget:
+            break
+        window.append(msg)
+        used += cost
+    window.reverse()
+    return window
+
+def unsummarised_messages(user_id, project, window):
+    """Return up to SUMMARY_BATCH_SIZE stored messages, oldest first, that are older than the window but not yet summarised."""
+    query = ChatMessage.query.filter(
+        ChatMessage.user_id == user_id,
+        ChatMessage.project_id == project.id,
+        ChatMessage.id > (project.summary_until_id or 0)
+    )
+    # Write-behind messages have no id and are always the newest, so the window's first stored row is the bound
+    stored = [msg.id for msg in window if msg.id is not None]
+    if stored:
+        query = query.filter(ChatMessage.id < stored[0])
+    return query.order_by(ChatMessage.id.asc()).limit(SUMMARY_BATCH_SIZE).all()
+
+def build_llm_context(user_id, project):
+    """Return the summary, the messages it does not cover yet and the window, as LLM messages.
+
+    The summary is only refreshed once SUMMARY_MIN_MESSAGES have left the
+    window, so the ones waiting for it are sent as they are. They can push the
+    prompt past CONTEXT_TOKEN_BUDGET, and the reply's quota lease is charged
+    for what was really sent.
+    """
+    window = context_window(user_id, project)
+    history = unsummarised_messages(user_id, project, window) + window
+    messages = [{"role": msg.role, "content": msg.content} for msg in history]
+    if project.summary:
+        messages = [{"role": "system", "content": f"Summary of the earlier conversation: {project.summary}"}] + messages
+    return messages
+
+def refresh_summary(user_id, project_id):
+    """Fold messages that have slid out of the context window into the project's rolling summary.
+
+    Waits until SUMMARY_MIN_MESSAGES have left the window, and charges the
+    summarisation call to the user's token budget like a reply.
+    """
+    project = db.session.get(ProjectIdea, project_id)
+    if not project:
+        return
+    window = context_window(user_id, project)
+    # Without a stored message in the window there is nothing older to fold in yet
+    if not window or window[0].id is None:
+        return
+
+    pending = unsummarised_messages(user_id, project, window)
+    if len(pending) < min(SUMMARY_MIN_MESSAGES, SUMMARY_BATCH_SIZE):
+        return
+
+    transcript = [{"role": msg.role, "content": msg.content} for msg in pending]
+    summary = summarize_conversation(project.summary, transcript)
+    if not summary:
+        return
+    user_quota.charge(user_id, tokens_used(transcript, (project.summary or "") + summary))
+    project.summary = summary
+    project.summary_until_id = pending[-1].id
+    db.session.commit()
+
+def refresh_summary_after_response(response, user_id, project_id):
+    app = current_app._get_current_object()
+
+    # Runs once the reply has been sent, so summarising never delays the user
+    def run():
+        with app.app_context():
+            try:
+                refresh_summary(user_id, project_id)
+            except Exception as e:
+                db.session.rollback()
+                app.logger.warning(f"Could not refresh conversation summary: {e}")
+    response.call_on_close(run)
+    return response
+
+def render_message_html(content):
+    return cpu_pool.run(render_markdown, content, EXTRA_TAGS, EXTRA_ATTRS, lane="render")
+
+# "stream" sends replies over SSE, "jobs" queues them and has the browser poll /jobs/<id>
+CHAT_MODE = os.getenv("CHAT_MODE", "stream")
+HISTORY_PAGE_SIZE = 50
+PREVIEW_LENGTH = 200
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_OFFSET = 500
+
+def parse_history_cursor(cursor):
+    """Decode a ``<iso timestamp>|<id>`` keyset cursor, ignoring malformed values."""
+    if not cursor:
+        return None
+    try:
+        timestamp, project_id = cursor.rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(project_id)
+    except ValueError:
+        return None
+
+def history_version(user_id):
+    """Values that change whenever any page of the user's /history would.
+
+    An aggregate over the user's projects and one index probe for their
+    newest message are much cheaper than building the pages, so a matching
+    If-None-Match is answered without touching the project list.
+    """
+    projects, updated = db.session.query(func.count(ProjectIdea.id), func.max(ProjectIdea.updated_at)).filter(
+        ProjectIdea.user_id == user_id,
+        ProjectIdea.public_id != None
+    ).one()
+    last_message = newest_message_query(user_id).scalar()
+    return projects, updated, last_message
+
+def newest_message_query(user_id):
+    # ORDER BY ... LIMIT 1 reads one entry of ix_chat_message_user_id; SQLite cannot turn a filtered max() into that
+    return db.session.query(ChatMessage.id).filter(ChatMessage.user_id == user_id).order_by(ChatMessage.id.desc()).limit(1)
+
+def conversation_version(user_id, project_id):
+    """Values that change whenever a project's messages would: stored messages only grow, pending ones come and go."""
+    last_message = db.session.query(func.max(ChatMessage.id)).filter(
+        ChatMessage.user_id == user_id,
+        ChatMessage.project_id == project_id
+    ).scalar()
+    pending = [msg.log_id for msg in message_log.pending(user_id, project_id)] if message_log.enabled else []
+    return last_message, pending
+
+def sse_event(payload):
+    return f"data: {json.dumps(payload)}\n\n"
+
+EXPORT_VERSION = 1
+EXPORT_BATCH_SIZE = 1000
+EXPORT_CHUNK_BYTES = 64 * 1024
+
+def export_records(user_id, batch_size=EXPORT_BATCH_SIZE):
+    """Yield a user's projects, then all their messages, as NDJSON lines.
+
+    Rows come back as plain tuples through ``yield_per``, which streams from a
+    server-side cursor on Postgres, so memory stays flat however long the
+    history is. Messages refer to their project by public_id.
+    """
+    user = db.session.get(User, user_id)
+    yield json.dumps({
+        "type": "user",
+        "version": EXPORT_VERSION,
+        "username": user.username,
+        "name": user.name,
+        "exported_at": datetime.utcnow().isoformat()
+    }) + "\n"
+
+    projects = db.session.execute(
+        db.select(ProjectIdea.public_id, ProjectIdea.topic, ProjectIdea.content, ProjectIdea.timestamp)
+        .where(ProjectIdea.user_id == user_id, ProjectIdea.public_id != None)
+        .order_by(ProjectIdea.id)
+        .execution_options(yield_per=batch_size)
+    )
+    for row in projects:
+        yield json.dumps({
+            "type": "project",
+            "public_id": row.public_id,
+            "topic": row.topic,
+            "content": row.content,
+            "timestamp": row.timestamp.isoformat() if row.timestamp else None
+        }) + "\n"
+
+    # (user_id, project_id, id) order is served by ix_chat_message_user_project_id without a sort
+    messages = db.session.execute(
+        db.select(ProjectIdea.public_id, ChatMessage.role, ChatMessage.content, ChatMessage.html, ChatMessage.timestamp,
+                  ChatMessage.content_z, ChatMessage.html_z)
+        .join(ProjectIdea, ProjectIdea.id == ChatMessage.project_id)
+        .where(ChatMessage.user_id == user_id, ProjectIdea.public_id != None)
+        .order_by(ChatMessage.project_id, ChatMessage.id)
+        .execution_options(yield_per=batch_size)
+    )
+    for row in messages:
+        yield json.dumps({
+            "type": "message",
+            "project_id": row.public_id,
+            "role": row.role,
+            "content": message_content(row.content, row.content_z),
+            "html": message_content(row.html, row.html_z),
+            "timestamp": row.timestamp.isoformat() if row.timestamp else None
+        }) + "\n"
+
+def chunked(lines, size=EXPORT_CHUNK_BYTES):
+    """Group small lines into larger writes for the WSGI server."""
+    buffer, length = [], 0
+    for line in lines:
+        buffer.append(line)
+        length += len(line)
+        if length >= size:
+            yield "".join(buffer)
+            buffer, length = [], 0
+    if buffer:
+        yield "".join(buffer)
+
+def import_records(user_id, lines, batch_size=EXPORT_BATCH_SIZE):
+    """Bulk-insert an export's projects and messages for a user, keeping public_ids.
+
+    Lines are read one at a time and inserted in batches of ``batch_size`` in
+    a single transaction. Projects whose public_id already exists are skipped
+    together with their messages, so re-running an import is safe. The file
+    is untrusted: text is cleaned as the routes clean it, and reply HTML is
+    rendered again from content rather than copied. Returns counts of what
+    was imported and skipped.
+    """
+    counts = {"projects": 0, "messages": 0, "skipped_projects": 0, "skipped_messages": 0}
+    project_ids = {}
+    projects, messages = [], []
+
+    def parse_timestamp(value):
+        return datetime.fromisoformat(value) if value else datetime.now()
+
+    def flush_projects():
+        public_ids = [row["public_id"] for row in projects]
+        existing = {row[0] for row in db.session.query(ProjectIdea.public_id).filter(ProjectIdea.public_id.in_(public_ids))}
+        rows = [row for row in projects if row["public_id"] not in existing]
+        if rows:
+            db.session.execute(insert(ProjectIdea), rows)
+        inserted = dict(db.session.query(ProjectIdea.public_id, ProjectIdea.id).filter(
+            ProjectIdea.public_id.in_([row["public_id"] for row in rows]),
+            ProjectIdea.user_id == user_id
+        )) if rows else {}
+        for public_id in public_ids:
+            project_ids[public_id] = inserted.get(public_id)
+        counts["projects"] += len(rows)
+        counts["skipped_projects"] += len(projects) - len(rows)
+        projects.clear()
+
+    def flush_messages():
+        if projects:
+            flush_projects()
+        rows = []
+        for row in messages:
+            project_id = project_ids.get(row.pop("project_public_id"))
+            if project_id is None:
+                counts["skipped_messages"] += 1
+                continue
+            rows.append({**row, "project_id": project_id})
+        if rows:
+            db.session.execute(insert(ChatMessage), rows)
+        counts["messages"] += len(rows)
+        messages.clear()
+
+    for line in lines:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        kind = record.get("type")
+        if kind == "user":
+            if record.get("version") != EXPORT_VERSION:
+                raise ValueError(f"Unsupported export version: {record.get('version')}")
+        elif kind == "project":
+            projects.append({
+                "user_id": user_id,
+                "public_id": record["public_id"],
+                "topic": bleach.clean(record["topic"]),
+                "content": bleach.clean(record["content"]),
+                "timestamp": parse_timestamp(record.get("timestamp"))
+            })
+            if len(projects) >= batch_size:
+                flush_projects()
+        elif kind == "message":
+            role, content = record["role"], record["content"]
+            if role not in ("user", "assistant"):
+                raise ValueError(f"Unsupported message role: {role}")
+            # Only the text is taken from the file, cleaned the way /chat cleans it
+            if role == "user":
+                content = bleach.clean(content, tags=['p', 'strong', 'em'], strip=True)
+            messages.append({
+                "user_id": user_id,
+                "project_public_id": record["project_id"],
+                "role": role,
+                "content": content,
+                "html": render_message_html(content) if role == "assistant" else None,
+                "timestamp": parse_timestamp(record.get("timestamp"))
+            })
+            if len(messages) >= batch_size:
+                flush_messages()
+
+    if projects:
+        flush_projects()
+    if messages:
+        flush_messages()
+    db.session.commit()
+    return counts
+
 def get_current_user():
     user_id = session.get('user_id')
     if user_id:
@@ -138,15 +784,15 @@ def get_current_user():
     return None
 
 # Routes
-@app.route('/')
+@bp.route('/')
 def index():
     return render_template("index.html")
 
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 @limiter.limit("10 per minute")
 def register():
     if session.get('user_id'):
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     form = RegisterForm()
     if form.validate_on_submit():
         name = bleach.clean(form.name.data.strip(), tags=['p', 'strong', 'em'], strip=True)
@@ -159,9 +805,10 @@ def register():
         try:
             if User.query.filter_by(username=username).first():
                 errors.append("Username already taken")
-        except OperationalError:
+        except OperationalError as e:
+            db_health.report_failure(e)
             flash("Our database just woke up. Please try again.", "warning")
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
 
         if errors:
             for error in errors:
@@ -169,12 +816,12 @@ def register():
             return render_template("register.html", form=form)
 
         try:
-            hashed_password = generate_password_hash(password, method='pbkdf2:sha256')
+            hashed_password = cpu_pool.run(hash_password, password)
             new_user = User(name=name, username=username, password=hashed_password)
             db.session.add(new_user)
             db.session.commit()
             flash("Registered successfully. Please log in.", "success")
-            return redirect(url_for("login"))
+            return redirect(url_for("main.login"))
         except Exception as e:
             db.session.rollback()
             flash("An error occurred while creating your account.", "danger")
@@ -182,12 +829,12 @@ def register():
     
     return render_template("register.html", form=form)
 
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 @limiter.limit("10 per minute")
 def login():
     session.permanent = True
     if session.get('user_id'):
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     form = LoginForm()
     if form.validate_on_submit():
         username = bleach.clean(form.username.data.strip(), tags=['p', 'strong', 'em'], strip=True)
@@ -201,71 +848,179 @@ def login():
         
         try:
             user = User.query.filter_by(username=username).first()
-            if user and check_password_hash(user.password, password):
+            if user and cpu_pool.run(verify_password, user.password, password):
                 session["user_id"] = user.id
                 session["username"] = user.username
                 flash(f"Welcome back, {user.name}", "success")
-                return redirect(url_for("get_generate"))
+                return redirect(url_for("main.get_generate"))
             else:
                 flash("Invalid username or password", "danger")
                 return render_template("login.html", form=form)
-        except OperationalError:
+        except OperationalError as e:
+            db_health.report_failure(e)
             flash("Our database just woke up. Please try again.", "warning")
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
     
     return render_template("login.html", form=form)
 
-@app.route('/logout')
+@bp.route('/logout')
 @login_required
 def logout():
     session.clear()
     flash("Logged out successfully.", "info")
-    return redirect(url_for("index"))
+    return redirect(url_for("main.index"))
 
-@app.route("/history")
+@bp.route("/history")
 @login_required
 def history():
     user_id = session.get("user_id")
-    projects = ProjectIdea.query.filter(ProjectIdea.user_id==user_id, ProjectIdea.public_id!=None).order_by(ProjectIdea.timestamp.desc()).all()
+    etag = http_cache.make_etag("history", user_id, request.full_path, *history_version(user_id))
+    if http_cache.is_fresh(etag):
+        return http_cache.not_modified(etag)
+
+    limit = max(min(request.args.get("limit", HISTORY_PAGE_SIZE, type=int), 100), 1)
+    cursor = parse_history_cursor(request.args.get("cursor"))
+
+    # Only the first PREVIEW_LENGTH + 1 characters of content ever leave the database
+    message_count = db.session.query(func.count(ChatMessage.id)).filter(
+        ChatMessage.user_id == user_id,
+        ChatMessage.project_id == ProjectIdea.id
+    ).correlate(ProjectIdea).scalar_subquery()
+    query = db.session.query(
+        ProjectIdea.id,
+        ProjectIdea.public_id,
+        ProjectIdea.topic,
+        ProjectIdea.timestamp,
+        func.substr(ProjectIdea.content, 1, PREVIEW_LENGTH + 1).label("preview"),
+        message_count.label("message_count")
+    ).filter(ProjectIdea.user_id==user_id, ProjectIdea.public_id!=None)
+
+    if cursor:
+        cursor_ts, cursor_id = cursor
+        query = query.filter(or_(
+            ProjectIdea.timestamp < cursor_ts,
+            and_(ProjectIdea.timestamp == cursor_ts, ProjectIdea.id < cursor_id)
+        ))
+    rows = query.order_by(ProjectIdea.timestamp.desc(), ProjectIdea.id.desc()).limit(limit + 1).all()
 
     history_data = []
-    for project in projects:
+    for row in rows[:limit]:
         history_data.append({
-            "id": project.id,
-            "public_id": project.public_id,
+            "id": row.id,
+            "public_id": row.public_id,
+            "topic": row.topic,
+            "content": row.preview[:PREVIEW_LENGTH] + "..." if len(row.preview) > PREVIEW_LENGTH else row.preview,
+            "message_count": row.message_count,
+            "timestamp": row.timestamp.strftime("%Y-%m-%d %H:%M")
+        })
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = f"{last.timestamp.isoformat()}|{last.id}"
+
+    return http_cache.revalidate(jsonify({"projects": history_data, "next_cursor": next_cursor}), etag)
+
+@bp.route("/search")
+@login_required
+def search_projects():
+    """Ranked full-text search over the user's projects and chat messages."""
+    user_id = session.get("user_id")
+    q = request.args.get("q", "").strip()
+    if not q:
+        return jsonify({"error": "Search query is required"}), 400
+    limit = max(min(request.args.get("limit", SEARCH_PAGE_SIZE, type=int), 50), 1)
+    # Ranked results page by offset; deep pages are not worth their cost
+    offset = max(min(request.args.get("offset", 0, type=int), SEARCH_MAX_OFFSET), 0)
+
+    hits = search.search(db.session.connection(), user_id, q, limit + 1, offset)
+    page = hits[:limit]
+
+    # Only the page's rows are loaded to build snippets
+    project_ids = {hit.project_id for hit in page}
+    message_ids = [hit.id for hit in page if hit.kind == "message"]
+    projects = {p.id: p for p in ProjectIdea.query.filter(ProjectIdea.id.in_(project_ids))} if project_ids else {}
+    messages = {m.id: m for m in ChatMessage.query.filter(ChatMessage.id.in_(message_ids))} if message_ids else {}
+
+    terms = search.query_terms(q)
+    results = []
+    for hit in page:
+        project = projects[hit.project_id]
+        if hit.kind == "message":
+            source = messages[hit.id]
+            body = source.content
+        else:
+            source = project
+            body = f"{project.topic}: {project.content}" if project.content else project.topic
+        results.append({
+            "type": hit.kind,
+            "project_id": project.public_id,
             "topic": project.topic,
-            "content": project.content[:200] + "..." if len(project.content) > 200 else project.content,
-            "timestamp": project.timestamp.strftime("%Y-%m-%d %H:%M")
+            "message_id": hit.id if hit.kind == "message" else None,
+            "snippet": search.snippet(body, terms),
+            "rank": float(hit.rank),
+            "timestamp": source.timestamp.strftime("%Y-%m-%d %H:%M")
         })
 
-    return jsonify(history_data)
+    next_offset = offset + limit if len(hits) > limit and offset + limit <= SEARCH_MAX_OFFSET else None
+    return jsonify({"results": results, "next_offset": next_offset})
+
+@bp.route("/export")
+@login_required
+@limiter.limit("5 per hour")
+def export():
+    """Download all of the user's projects and messages as NDJSON."""
+    user_id = session.get("user_id")
+    filename = f"genproject-export-{datetime.now():%Y%m%d}.ndjson"
+    return Response(
+        stream_with_context(chunked(export_records(user_id))),
+        mimetype="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "X-Accel-Buffering": "no"}
+    )
 
-@app.route("/generate", methods=["GET"])
+@bp.route("/generate", methods=["GET"])
 @login_required
 def get_generate():
     user_id = session.get("user_id")
     project = ProjectIdea.query.filter(ProjectIdea.user_id==user_id, ProjectIdea.public_id!=None).order_by(ProjectIdea.timestamp.desc()).first()
 
+    # Flashed messages are shown once, so a page carrying them is never answered with a 304
+    etag = None
+    if not session.get("_flashes"):
+        etag = http_cache.make_etag(
+            "generate", user_id, session.get("username"), CHAT_MODE,
+            http_cache.release(os.path.join(current_app.root_path, current_app.template_folder), current_app.static_folder),
+            project and (project.id, project.topic, project.updated_at),
+            project and conversation_version(user_id, project.id)
+        )
+        if http_cache.is_fresh(etag):
+            return http_cache.not_modified(etag)
+
     chat_history = []
+    has_more = False
     if project:
-        conversation = ChatMessage.query.filter_by(user_id=user_id, project_id=project.id).order_by(ChatMessage.timestamp.asc()).all()
+        conversation, has_more = message_page(user_id, project.id, limit=FIRST_PAINT_MESSAGES)
 
         for msg in conversation:
             content = msg.content
             if msg.role == "assistant":
-                html = markdown.markdown(content, extensions=["fenced_code", "tables", "codehilite"])
-                html = bleach.clean(html, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRS, strip=True)
-                content = Markup(html)
+                # Rows written before the html column existed are rendered on the fly until backfilled
+                content = Markup(msg.html or render_message_html(content))
 
             chat_history.append({
+                    "id": msg.id,
+                    "log_id": msg.log_id,
                     "role": msg.role,
                     "content": content,
                     "timestamp": msg.timestamp.strftime("%Y-%m-%d %H:%M")
                 })
 
-    return render_template("generate.html", chat_history=chat_history, selected_project=project)
+    response = current_app.make_response(render_template(
+        "generate.html", chat_history=chat_history, has_more=has_more, selected_project=project, chat_mode=CHAT_MODE
+    ))
+    return http_cache.revalidate(response, etag) if etag else response
 
-@app.route("/chat", methods=["POST"])
+@bp.route("/chat", methods=["POST"])
 @login_required
 def chat():
     user_id = session.get("user_id")
@@ -277,70 +1032,153 @@ def chat():
         return jsonify({"error": "Invalid or missing project id"}), 400
     
     if not message_text.strip():
-        conversation = ChatMessage.query.filter_by(user_id=user_id, project_id=project.id).order_by(ChatMessage.timestamp.asc()).all()
-        chat_history = [
-            {
-                "role": msg.role,
-                "content": msg.content,
-                "timestamp": msg.timestamp.strftime("%Y-%m-%d %H:%M")
+        conversation, has_more = message_page(user_id, project.id)
+        return jsonify({"history": [serialize_message(msg) for msg in conversation], "has_more": has_more})
+
+    # Wait for the user's quota before storing the message, so a refused turn can simply be resent
+    lease = user_quota.acquire(user_id, generation_cost(message_text))
+    # Nothing is charged for a turn that fails before the LLM answers
+    used = 0
+    try:
+        user_msg = add_message(user_id, project.id, "user", message_text)
+        db.session.commit()
+
+        if data.get("async"):
+            payload = {
+                "user_id": user_id,
+                "project_id": project.id,
+                "fresh": bool(data.get("fresh")),
+                "socket_id": request.headers.get("X-Socket-Id")
             }
-            for msg in conversation
-        ]
-        return jsonify({"history": chat_history})
-
-    user_msg = ChatMessage(
-        user_id=user_id,
-        project_id=project.id,
-        role="user",
-        content=message_text
-    )
-    db.session.add(user_msg)
-    db.session.commit()
+            if lease:
+                payload["lease"] = lease.to_dict()
+            try:
+                job_id = job_queue.enqueue(payload, owner=user_id)
+            except Exception as e:
+                # No job will answer the message, so take it back for the user to resend
+                discard_message(user_msg)
+                if isinstance(e, JobQueueFull):
+                    return jsonify({"error": "Too many replies are being generated. Please try again shortly."}), 503
+                raise
+            lease = None
+            publish_message(user_id, project, user_msg)
+            return jsonify({"job_id": job_id, "status": "queued", "message": serialize_message(user_msg)}), 202
 
-    conversation = ChatMessage.query.filter_by(user_id=user_id, project_id=project.id).order_by(ChatMessage.timestamp.asc()).all()
-    messages_for_llm = [
-        {"role": msg.role, "content": msg.content}
-        for msg in conversation[-10:]
-    ]
+        publish_message(user_id, project, user_msg)
+        messages_for_llm = build_llm_context(user_id, project)
 
-    ai_reply = generate_project_idea(messages_for_llm)
+        ai_reply = generate_project_idea(messages_for_llm, use_cache=not data.get("fresh", False))
+        used = tokens_used(messages_for_llm, ai_reply)
 
-    ai_msg = ChatMessage(
-        user_id=user_id,
-        project_id=project.id,
-        role="assistant",
-        content=ai_reply
-    )
-    db.session.add(ai_msg)
-
-    if project.topic.startswith("Untitled Project"):
-        title = None
-        for line in ai_reply.splitlines():
-            if "Project Title:" in line:
-                title = line.replace("Project Title:", "").strip()
-                break
-        if not title:
-            title = ai_reply.split("\n")[0][25:50]
-
-        if title:
-            title = re.sub(r"[*_`]+", "", title).strip()
-            
-        project.topic = title or "AI Project"
+        ai_msg = save_assistant_reply(user_id, project, ai_reply)
+    finally:
+        user_quota.release(lease, used)
 
-    db.session.commit()
+    response = jsonify({
+        "reply": ai_reply,
+        "project_title": project.topic,
+        "project_id": project.public_id,
+        "messages": [serialize_message(user_msg), serialize_message(ai_msg)]
+    })
+    return refresh_summary_after_response(response, user_id, project.id)
+
+@bp.route("/projects/<public_id>/messages")
+@login_required
+def project_messages(public_id):
+    user_id = session.get("user_id")
+    project = ProjectIdea.query.filter_by(public_id=public_id, user_id=user_id).first()
+    if not project:
+        return jsonify({"error": "Project not found"}), 404
 
-    conversation = ChatMessage.query.filter_by(user_id=user_id, project_id=project.id).order_by(ChatMessage.timestamp.asc()).all()
-    chat_history = [
-        {
-            "role": msg.role,
-            "content": msg.content,
-            "timestamp": msg.timestamp.strftime("%Y-%m-%d %H:%M")
-        }
-        for msg in conversation
-    ]
-    return jsonify({"reply": ai_reply, "project_title": project.topic, "project_id": project.public_id, "history": chat_history})
-
-@app.route("/create_project", methods=["POST"])
+    etag = http_cache.make_etag("messages", user_id, request.full_path, *conversation_version(user_id, project.id))
+    if http_cache.is_fresh(etag):
+        return http_cache.not_modified(etag)
+
+    after = request.args.get("after", type=int)
+    before = request.args.get("before", type=int)
+    limit = min(request.args.get("limit", MESSAGE_PAGE_SIZE, type=int), 200)
+    messages, has_more = message_page(user_id, project.id, after=after, before=before, limit=max(limit, 1))
+    response = jsonify({"messages": [serialize_message(msg) for msg in messages], "has_more": has_more})
+    return http_cache.revalidate(response, etag)
+
+@bp.route("/jobs/<job_id>")
+@login_required
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if not job or job["owner"] != session.get("user_id"):
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify({"job_id": job["id"], "status": job["status"], "result": job["result"], "error": job["error"]})
+
+@bp.route("/chat/stream", methods=["POST"])
+@login_required
+def chat_stream():
+    user_id = session.get("user_id")
+    data = request.get_json()
+    message_text = bleach.clean(data.get("message", ""), tags=['p', 'strong', 'em'], strip=True)
+    project_public_id = data.get("project_id")
+    project = ProjectIdea.query.filter_by(public_id=project_public_id, user_id=user_id).first()
+    if not project:
+        return jsonify({"error": "Invalid or missing project id"}), 400
+    if not message_text.strip():
+        return jsonify({"error": "Message is required"}), 400
+
+    lease = user_quota.acquire(user_id, generation_cost(message_text))
+    try:
+        user_msg = add_message(user_id, project.id, "user", message_text)
+        db.session.commit()
+        publish_message(user_id, project, user_msg)
+        messages_for_llm = build_llm_context(user_id, project)
+    except BaseException:
+        user_quota.release(lease, 0)
+        raise
+
+    released = False
+
+    def release_lease(used):
+        nonlocal released
+        if not released:
+            released = True
+            user_quota.release(lease, used)
+
+    def generate():
+        parts = []
+        saved = False
+        try:
+            for token in stream_project_idea(messages_for_llm, use_cache=not data.get("fresh", False)):
+                parts.append(token)
+                yield sse_event({"token": token})
+
+            ai_reply = "".join(parts).strip() or "Error: Empty response from AI"
+            ai_msg = save_assistant_reply(user_id, project, ai_reply)
+            saved = True
+
+            yield sse_event({
+                "done": True,
+                "project_title": project.topic,
+                "project_id": project.public_id,
+                "user_message": serialize_message(user_msg),
+                "message": serialize_message(ai_msg)
+            })
+        finally:
+            # Keep whatever was generated if the client went away mid-stream
+            partial = "".join(parts).strip()
+            release_lease(tokens_used(messages_for_llm, partial))
+            if not saved and partial:
+                db.session.rollback()
+                partial_msg = add_message(user_id, project.id, "assistant", partial, render_message_html(partial))
+                db.session.commit()
+                publish_message(user_id, project, partial_msg)
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    # A client that disconnects before the first chunk closes the generator unstarted, skipping its finally
+    response.call_on_close(lambda: release_lease(0))
+    return refresh_summary_after_response(response, user_id, project.id)
+
+@bp.route("/create_project", methods=["POST"])
 @login_required
 def create_project():
     user_id = session.get("user_id")
@@ -350,9 +1188,11 @@ def create_project():
     new_project = ProjectIdea(user_id=user_id, topic=topic, content=content)
     db.session.add(new_project)
     db.session.commit()
-    return jsonify({"public_id": new_project.public_id})
+    event = project_event(new_project)
+    realtime.publish(user_id, "project_created", event)
+    return jsonify(event)
 
-@app.route("/rename_project", methods=["POST"])
+@bp.route("/rename_project", methods=["POST"])
 @login_required
 def rename_project():
     user_id = session.get("user_id")
@@ -364,9 +1204,11 @@ def rename_project():
         return jsonify({"error": "Project not found"}), 404
     project.topic = topic
     db.session.commit()
-    return jsonify({"success": True})
+    event = project_event(project)
+    realtime.publish(user_id, "project_updated", event)
+    return jsonify({"success": True, **event})
 
-@app.route("/delete_project", methods=["POST"])
+@bp.route("/delete_project", methods=["POST"])
 @login_required
 def delete_project():
     user_id = session.get("user_id")
@@ -380,15 +1222,162 @@ def delete_project():
 
     db.session.delete(project)
     db.session.commit()
+    realtime.publish(user_id, "project_deleted", {"public_id": project_public_id})
     return jsonify({"success": True})
 
-@app.route('/health')
+@bp.cli.command("backfill-html")
+@click.option("--batch-size", default=500, show_default=True, help="Rows rendered per commit.")
+def backfill_html(batch_size):
+    """Pre-render HTML for assistant messages stored before the html column existed."""
+    last_id = 0
+    total = 0
+    while True:
+        batch = ChatMessage.query.filter(
+            ChatMessage.role == "assistant",
+            ChatMessage.html.is_(None),
+            ChatMessage.content_z.is_(None),
+            ChatMessage.id > last_id
+        ).order_by(ChatMessage.id.asc()).limit(batch_size).all()
+        if not batch:
+            break
+        for msg in batch:
+            msg.html = render_message_html(msg.content)
+        db.session.commit()
+        last_id = batch[-1].id
+        total += len(batch)
+    click.echo(f"Rendered HTML for {total} messages")
+
+@bp.cli.command("export-user")
+@click.argument("username")
+@click.option("--output", type=click.File("w"), default="-", help="File to write, stdout by default.")
+def export_user(username, output):
+    """Write a user's projects and messages as NDJSON."""
+    user = User.query.filter_by(username=username).first()
+    if not user:
+        raise click.ClickException(f"No user named {username}")
+    for chunk in chunked(export_records(user.id)):
+        output.write(chunk)
+
+@bp.cli.command("import-user")
+@click.argument("username")
+@click.argument("source", type=click.File("r"))
+@click.option("--batch-size", default=EXPORT_BATCH_SIZE, show_default=True, help="Rows per bulk insert.")
+def import_user(username, source, batch_size):
+    """Import an NDJSON export into an existing user's account."""
+    user = User.query.filter_by(username=username).first()
+    if not user:
+        raise click.ClickException(f"No user named {username}")
+    counts = import_records(user.id, source, batch_size)
+    click.echo(f"Imported {counts['projects']} projects and {counts['messages']} messages "
+               f"(skipped {counts['skipped_projects']} existing projects, {counts['skipped_messages']} messages)")
+
+@bp.cli.command("rebuild-search-index")
+def rebuild_search_index():
+    """Create any missing full-text search objects and re-index every row."""
+    with db.engine.begin() as conn:
+        search.ensure_index(conn)
+        search.rebuild_index(conn)
+    click.echo(f"Search index rebuilt ({db.engine.dialect.name})")
+
+@bp.cli.command("compact-messages")
+@click.option("--older-than-days", type=float, default=None, help="Override COMPACT_AFTER_DAYS.")
+def compact_messages(older_than_days):
+    """Compress chat messages older than COMPACT_AFTER_DAYS into cold storage."""
+    run = compactor.run_once(older_than_days)
+    saved = run["bytes_before"] - run["bytes_after"]
+    click.echo(f"Compacted {run['rows']} messages: {run['bytes_before']} -> {run['bytes_after']} bytes ({saved} saved)")
+
+@bp.cli.command("generation-worker")
+def generation_worker():
+    """Run queued /chat generations from Redis (JOB_BACKEND=redis)."""
+    if job_queue.backend != "redis":
+        # Local jobs run inside the web processes; this one would wait on a queue nobody fills
+        raise click.ClickException("generation-worker needs JOB_BACKEND=redis; with the local backend, scale the worker process to 0")
+    job_queue.work_forever()
+
+@bp.cli.command("prompt-cache-stats")
+def prompt_cache_stats():
+    """Print hit/miss/coalesced counters for the first-turn prompt cache."""
+    state = "enabled" if prompt_cache.enabled else "disabled"
+    click.echo(f"Prompt cache {state}: {json.dumps(prompt_cache.stats(), sort_keys=True)}")
+
+# name -> (index the plan must use, query builder)
+HOT_QUERIES = {
+    "chat_message_page": (
+        "ix_chat_message_user_project_id",
+        lambda: ChatMessage.query.filter_by(user_id=1, project_id=1).filter(ChatMessage.id < 100).order_by(ChatMessage.id.desc()).limit(MESSAGE_PAGE_SIZE + 1)
+    ),
+    "chat_message_after": (
+        "ix_chat_message_user_project_id",
+        lambda: ChatMessage.query.filter_by(user_id=1, project_id=1).filter(ChatMessage.id > 100).order_by(ChatMessage.id.asc()).limit(MESSAGE_PAGE_SIZE + 1)
+    ),
+    "history_version": (
+        "ix_chat_message_user_id",
+        lambda: newest_message_query(1)
+    ),
+    "project_history": (
+        "ix_project_idea_user_timestamp",
+        lambda: ProjectIdea.query.filter(ProjectIdea.user_id == 1, ProjectIdea.public_id != None).order_by(ProjectIdea.timestamp.desc(), ProjectIdea.id.desc()).limit(HISTORY_PAGE_SIZE + 1)
+    ),
+}
+
+def explain_query(query):
+    """Return the database's plan for a query as a list of text lines."""
+    statement = str(query.statement.compile(db.engine, compile_kwargs={"literal_binds": True}))
+    with db.engine.connect() as conn:
+        if db.engine.dialect.name == "sqlite":
+            rows = conn.execute(text(f"EXPLAIN QUERY PLAN {statement}")).fetchall()
+            return [row[-1] for row in rows]
+        # Tiny tables make a sequential scan the cheapest plan, so ask whether an index is usable at all
+        conn.execute(text("SET enable_seqscan = off"))
+        return [row[0] for row in conn.execute(text(f"EXPLAIN {statement}")).fetchall()]
+
+def plan_problems(plan, index_name):
+    problems = []
+    if not any(index_name in line for line in plan):
+        problems.append(f"{index_name} is not used")
+    for line in plan:
+        if "Seq Scan" in line or (line.startswith("SCAN ") and "USING" not in line):
+            problems.append(f"full table scan: {line.strip()}")
+        if "TEMP B-TREE" in line or line.strip().startswith("Sort"):
+            problems.append(f"sort not served by an index: {line.strip()}")
+    return problems
+
+@bp.cli.command("check-query-plans")
+def check_query_plans():
+    """Fail if any hot chat/history query stops using its composite index."""
+    failed = False
+    for name, (index_name, build) in HOT_QUERIES.items():
+        plan = explain_query(build())
+        problems = plan_problems(plan, index_name)
+        click.echo(f"{name}: {'FAIL' if problems else 'ok'}")
+        for line in plan + problems:
+            click.echo(f"    {line}")
+        failed = failed or bool(problems)
+    if failed:
+        raise SystemExit(1)
+
+def collect_prompt_cache_metrics():
+    lines = ["# HELP prompt_cache_events_total First-turn prompt cache lookups by result.", "# TYPE prompt_cache_events_total counter"]
+    for result, value in sorted(prompt_cache.stats().items()):
+        lines.append(f'prompt_cache_events_total{{result="{result}"}} {value}')
+    return lines
+
+metrics.registry.collectors.append(collect_prompt_cache_metrics)
+
+@bp.route('/metrics')
+@limiter.exempt
+def metrics_endpoint():
+    token = os.getenv("METRICS_TOKEN")
+    if token and request.headers.get("Authorization") != f"Bearer {token}":
+        return jsonify({"error": "Unauthorized"}), 401
+    return Response(metrics.registry.render(), mimetype="text/plain; version=0.0.4")
+
+@bp.route('/health')
 def health():
-    try:
-        db.session.execute(text("SELECT 1"))
+    if db_health.healthy:
         return "OK", 200
-    except:
-        return "Database unreachable", 500
+    return "Database unreachable", 500
 
 if __name__ == "__main__":
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
\ No newline at end of file
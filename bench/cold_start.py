@@ -0,0 +1,147 @@
+"""Cold-start benchmark: import time and time to first response.
+
+Each run starts a fresh interpreter, as a woken dyno does. The interpreter
+imports app, builds it with create_app() and serves one request through the
+test client, timing each step. The parent also times the whole process,
+including interpreter start-up. A final run under ``python -X importtime``
+lists the slowest imports, so a new heavy import shows up in review.
+
+    python bench/cold_start.py --runs 5 --output cold_start.json
+    python bench/cold_start.py --baseline cold_start.json --max-regression 0.2
+
+With --baseline the run exits non-zero if any median grows by more than
+--max-regression. Rate limiting applies to the first request (GET / by default),
+so REDIS_URL must point at a reachable server, as for the load test.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+import statistics
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+flask_app = app.create_app()
+created = time.perf_counter()
+response = flask_app.test_client().get(sys.argv[1])
+served = time.perf_counter()
+print(json.dumps({
+    "status": response.status_code,
+    "import_ms": (imported - started) * 1000,
+    "create_app_ms": (created - imported) * 1000,
+    "first_request_ms": (served - created) * 1000,
+    "ready_ms": (served - started) * 1000
+}))
+"""
+
+METRICS = ("process_ms", "import_ms", "create_app_ms", "first_request_ms", "ready_ms")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="GenProject cold-start benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/", help="first request to serve")
+    parser.add_argument("--top-imports", type=int, default=15)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--baseline", help="JSON results from an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed relative increase of a median")
+    return parser.parse_args(argv)
+
+
+def child_env():
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='genproject-cold-'), 'cold.db')}")
+    env.setdefault("SECRET_KEY", "bench")
+    env.setdefault("REDIS_URL", "redis://localhost:6379/0")
+    env.setdefault("GROQ_API_KEY", "bench")
+    return env
+
+
+def run_once(path, env):
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, "-c", CHILD, path], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    sample = json.loads(result.stdout.strip().splitlines()[-1])
+    sample["process_ms"] = (time.perf_counter() - started) * 1000
+    return sample
+
+
+def slowest_imports(env, limit):
+    '''Top-level modules imported by ``import app``, by cumulative import time'''
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app"], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    children = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        # importtime lists children before their parent, each level indented two more spaces
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0:
+            if name.strip() == "app":
+                return sorted(children, reverse=True)[:limit]
+            children = []
+        elif depth == 1:
+            children.append((int(cumulative) / 1000, name.strip()))
+    return []
+
+
+def find_regressions(results, baseline, max_regression, noise_floor_ms=20.0):
+    regressions = []
+    for metric, current in results["median"].items():
+        previous = baseline.get("median", {}).get(metric)
+        if previous is None:
+            continue
+        if current > previous * (1 + max_regression) and current - previous > noise_floor_ms:
+            regressions.append(f"{metric}: {previous:.0f}ms -> {current:.0f}ms")
+    return regressions
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    env = child_env()
+    # One unmeasured run creates the SQLite file and warms the OS page cache
+    run_once(args.path, env)
+    samples = [run_once(args.path, env) for _ in range(args.runs)]
+
+    results = {
+        "runs": args.runs,
+        "path": args.path,
+        "status": samples[-1]["status"],
+        "median": {metric: round(statistics.median(s[metric] for s in samples), 1) for metric in METRICS},
+        "max": {metric: round(max(s[metric] for s in samples), 1) for metric in METRICS},
+        "slowest_imports": [{"module": name, "ms": round(ms, 1)} for ms, name in slowest_imports(env, args.top_imports)]
+    }
+
+    print(f"{'':<18}{'median ms':>11}{'max ms':>10}")
+    for metric in METRICS:
+        print(f"{metric:<18}{results['median'][metric]:>11}{results['max'][metric]:>10}")
+    print(f"\nGET {args.path} -> {results['status']}\n\nSlowest imports under app:")
+    for entry in results["slowest_imports"]:
+        print(f"  {entry['module']:<28}{entry['ms']:>8} ms")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.max_regression)
+        if regressions:
+            print("\nRegressions:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
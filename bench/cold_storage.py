@@ -0,0 +1,185 @@
+"""How much do compacted chat messages save, and what do reads cost?
+
+Fills a throwaway database with one user's conversations of verbose,
+markdown-heavy assistant replies, dated older than the compaction cutoff.
+It then measures the chat_message table before and after
+`flask compact-messages`. Results show bytes on disk and the number of
+database pages the table occupies, which is the buffer-cache footprint
+of reading all of it. They also show how long loading every conversation
+through the ORM takes, since decompression happens on read.
+
+    python bench/cold_storage.py --messages 20000
+    DATABASE_URL=postgresql://... python bench/cold_storage.py --output cold_storage.json
+
+SQLite is measured with its dbstat table, Postgres with
+pg_total_relation_size() (heap, TOAST and indexes). Both are vacuumed
+after compaction so freed space shows up. Against Postgres this writes real
+rows, so point it at a scratch database.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SECTIONS = [
+    "Project Title: **{name}**",
+    "## Description\n{sentence} {sentence} {sentence}",
+    "## Tech Stack\n- **Backend:** {backend}\n- **Frontend:** {frontend}\n- **Database:** {database}",
+    "## Key Features\n- {feature}\n- {feature}\n- {feature}\n- {feature}",
+    "## Getting Started\n```python\nfrom flask import Flask, jsonify\n\napp = Flask(__name__)\n\n@app.route('/{route}')\ndef {route}():\n    return jsonify({{\"status\": \"ok\", \"items\": []}})\n```",
+    "## Next Steps\n1. {sentence}\n2. {sentence}\n3. {sentence}",
+    "**Difficulty:** {level}. {sentence}",
+]
+WORDS = {
+    "name": ["Habit Tracker API", "Recipe Planner", "Budget Dashboard", "Study Buddy", "Weather Alerts", "Code Review Bot"],
+    "sentence": [
+        "This project helps you practise REST API design while building something you will actually use.",
+        "Start with a minimal version and add authentication once the core flow works end to end.",
+        "You will learn how to structure a Flask application with blueprints and a service layer.",
+        "Consider caching expensive responses so the app stays fast as the dataset grows.",
+        "Write tests for the happy path first, then cover validation errors and edge cases.",
+        "Deploying early to a free tier keeps the feedback loop short and motivating.",
+        "Keep the data model small at first; you can always add columns with a migration later.",
+    ],
+    "backend": ["Python, Flask", "Node.js, Express", "Go, chi", "Python, FastAPI"],
+    "frontend": ["React", "Vue", "HTMX", "Svelte"],
+    "database": ["PostgreSQL", "SQLite", "MongoDB", "Redis"],
+    "feature": ["User accounts and sessions", "Daily reminders by email", "Charts of weekly progress",
+                "CSV export", "Search with filters", "Dark mode", "Shareable public links"],
+    "route": ["habits", "recipes", "budgets", "alerts", "reviews"],
+    "level": ["Beginner", "Intermediate", "Advanced"],
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="GenProject cold storage benchmark")
+    parser.add_argument("--messages", type=int, default=10000, help="messages to generate, half of them assistant replies")
+    parser.add_argument("--projects", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    return parser.parse_args(argv)
+
+
+def fill(template, rng):
+    return template.format(**{key: rng.choice(values) for key, values in WORDS.items()})
+
+
+def assistant_reply(rng):
+    return "\n\n".join(fill(section, rng) for section in SECTIONS if rng.random() < 0.9)
+
+
+def table_footprint(conn):
+    from sqlalchemy import text
+    if conn.dialect.name == "postgresql":
+        size = conn.execute(text("SELECT pg_total_relation_size('chat_message')")).scalar()
+        page_size = int(conn.execute(text("SHOW block_size")).scalar())
+    else:
+        size = conn.execute(text("SELECT sum(pgsize) FROM dbstat WHERE name IN (SELECT name FROM sqlite_master WHERE tbl_name = 'chat_message')")).scalar()
+        page_size = conn.execute(text("PRAGMA page_size")).scalar()
+    return {"bytes": size, "pages": size // page_size}
+
+
+def vacuum(engine):
+    from sqlalchemy import text
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM FULL chat_message" if engine.dialect.name == "postgresql" else "VACUUM"))
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if not os.getenv("DATABASE_URL", "").startswith("postgresql"):
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='genproject-cold-'), 'cold.db')}"
+    os.environ.setdefault("SECRET_KEY", "bench")
+    os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+    os.environ.setdefault("GROQ_API_KEY", "bench")
+
+    from sqlalchemy import insert
+    import app as genproject
+    from cold_storage import compactor
+
+    rng = random.Random(args.seed)
+    flask_app = genproject.create_app()
+    with flask_app.app_context():
+        db = genproject.db
+        db.create_all()
+        user = genproject.User(name="Bench", username=f"cold{int(time.time())}", password="x")
+        db.session.add(user)
+        db.session.flush()
+        projects = [genproject.ProjectIdea(user_id=user.id, topic=f"Project {i}", content="") for i in range(args.projects)]
+        db.session.add_all(projects)
+        db.session.flush()
+        user_id, project_ids = user.id, [project.id for project in projects]
+
+        old = datetime.now() - timedelta(days=compactor.after_days + 1)
+        rows = []
+        for i in range(args.messages):
+            assistant = i % 2 == 1
+            content = assistant_reply(rng) if assistant else f"Can you suggest a {fill('{level}', rng).lower()} project using {fill('{backend}', rng)}?"
+            rows.append({
+                "user_id": user_id,
+                "project_id": project_ids[(i // 2) % args.projects],
+                "role": "assistant" if assistant else "user",
+                "content": content,
+                "html": genproject.render_markdown(content, genproject.EXTRA_TAGS, genproject.EXTRA_ATTRS) if assistant else None,
+                "timestamp": old + timedelta(seconds=i)
+            })
+        db.session.execute(insert(genproject.ChatMessage), rows)
+        db.session.commit()
+        del rows
+
+        def read_all():
+            started = time.perf_counter()
+            for project_id in project_ids:
+                genproject.message_page(user_id, project_id, limit=10 ** 6)
+            db.session.expunge_all()
+            return (time.perf_counter() - started) * 1000
+
+        vacuum(db.engine)
+        with db.engine.connect() as conn:
+            before = table_footprint(conn)
+        before["read_all_ms"] = read_all()
+
+        started = time.perf_counter()
+        run = compactor.run_once(after_days=compactor.after_days)
+        compaction_s = time.perf_counter() - started
+
+        vacuum(db.engine)
+        with db.engine.connect() as conn:
+            after = table_footprint(conn)
+        after["read_all_ms"] = read_all()
+        dialect = db.engine.dialect.name
+
+    results = {
+        "database": dialect,
+        "messages": args.messages,
+        "compacted": run["rows"],
+        "compaction_s": round(compaction_s, 2),
+        "content_bytes": {"before": run["bytes_before"], "after": run["bytes_after"]},
+        "table": {"before": before, "after": after}
+    }
+
+    print(f"{results['database']}: compacted {run['rows']} of {args.messages} messages in {results['compaction_s']}s")
+    print(f"{'':<22}{'before':>14}{'after':>14}{'change':>9}")
+    for label, b, a in (
+        ("content+html bytes", run["bytes_before"], run["bytes_after"]),
+        ("table bytes", before["bytes"], after["bytes"]),
+        ("table pages", before["pages"], after["pages"]),
+        ("read all ms", round(before["read_all_ms"], 1), round(after["read_all_ms"], 1)),
+    ):
+        change = f"{(a - b) / b * 100:+.0f}%" if b else ""
+        print(f"{label:<22}{b:>14}{a:>14}{change:>9}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""Does a burst of logins stall chat requests under the eventlet worker?
+
+For each CPU_POOL mode this serves the app with eventlet.wsgi, as the Procfile's
+eventlet worker does, against a throwaway SQLite database and the fake Groq
+server. One user sends chat turns back to back, first alone and then while a
+burst of other users log in. It reports chat p50/p95 for both phases and the
+login p95. With CPU_POOL=inline every pbkdf2 check blocks the hub. With the
+process pool, chat latency should barely move during the burst.
+
+    python bench/cpu_offload.py --logins 20 --chats 20
+    python bench/cpu_offload.py --modes inline process --output cpu_offload.json
+
+Each mode runs in a fresh interpreter because eventlet must monkey-patch
+before anything else is imported. Sessions still need REDIS_URL.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODES = ("inline", "thread", "process")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="GenProject CPU offload benchmark")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--logins", type=int, default=20, help="concurrent logins in the burst")
+    parser.add_argument("--chats", type=int, default=20, help="chat turns per phase")
+    parser.add_argument("--llm-latency", type=float, default=0.05)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--run-mode", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--groq-url", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def run_mode(args):
+    import eventlet
+    eventlet.monkey_patch()
+    os.environ["CPU_POOL"] = args.run_mode
+
+    import tempfile
+    import httpx
+    from eventlet import wsgi
+
+    from bench.load_test import prepare_app, percentile
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="genproject-cpu-"), "bench.db")
+    flask_app = prepare_app(args.groq_url, db_path)
+
+    listener = eventlet.listen(("127.0.0.1", 0))
+    eventlet.spawn(wsgi.server, listener, flask_app, log_output=False)
+    base_url = f"http://127.0.0.1:{listener.getsockname()[1]}"
+
+    def client():
+        return httpx.Client(base_url=base_url, timeout=120)
+
+    def register(username):
+        with client() as c:
+            c.post("/register", data={"name": "Bench", "username": username, "password": "benchpass"})
+
+    def login(username):
+        with client() as c:
+            started = time.perf_counter()
+            c.post("/login", data={"username": username, "password": "benchpass"})
+            return time.perf_counter() - started
+
+    pool = eventlet.GreenPool()
+    names = [f"burst{i}" for i in range(args.logins)]
+    list(pool.imap(register, names + ["chatter"]))
+
+    chatter = client()
+    chatter.post("/login", data={"username": "chatter", "password": "benchpass"})
+    public_id = chatter.post("/create_project", json={"topic": "Untitled Project"}).json()["public_id"]
+
+    def chat_phase():
+        samples = []
+        for turn in range(args.chats):
+            started = time.perf_counter()
+            chatter.post("/chat", json={"message": f"Suggest a project {turn}", "project_id": public_id})
+            samples.append(time.perf_counter() - started)
+        return samples
+
+    quiet = chat_phase()
+    burst = pool.spawn(lambda: list(eventlet.GreenPool().imap(login, names)))
+    eventlet.sleep(0)
+    during = chat_phase()
+    logins = burst.wait()
+
+    def stats(values):
+        return {"p50_ms": round(percentile(values, 50) * 1000, 1), "p95_ms": round(percentile(values, 95) * 1000, 1)}
+
+    return {"chat_quiet": stats(quiet), "chat_during_logins": stats(during), "login": stats(logins)}
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.run_mode:
+        print(json.dumps(run_mode(args)))
+        return 0
+
+    from bench.fake_groq import start_fake_groq
+
+    # Served from this unpatched process: under eventlet, HTTPServer's getfqdn() goes through green DNS
+    fake_server, groq_url = start_fake_groq(latency=args.llm_latency, jitter=0, tokens_per_second=2000.0)
+    results = {}
+    for mode in args.modes:
+        command = [sys.executable, os.path.abspath(__file__), "--run-mode", mode, "--groq-url", groq_url,
+                   "--logins", str(args.logins), "--chats", str(args.chats), "--llm-latency", str(args.llm_latency)]
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+    fake_server.shutdown()
+
+    print(f"{'CPU_POOL':<10}{'chat p50':>10}{'chat p95':>10}{'burst p50':>11}{'burst p95':>11}{'login p95':>11}")
+    for mode, r in results.items():
+        print(f"{mode:<10}{r['chat_quiet']['p50_ms']:>10}{r['chat_quiet']['p95_ms']:>10}"
+              f"{r['chat_during_logins']['p50_ms']:>11}{r['chat_during_logins']['p95_ms']:>11}{r['login']['p95_ms']:>11}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
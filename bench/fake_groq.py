@@ -0,0 +1,115 @@
+"""Minimal Groq/OpenAI-compatible chat completions server for benchmarks.
+
+Run standalone with ``python bench/fake_groq.py --port 8099`` and point the
+app at it with ``GROQ_BASE_URL=http://127.0.0.1:8099``, or start it from
+another script with ``start_fake_groq()``.
+"""
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+REPLY = (
+    "Project Title: Habit Tracker API\n\n"
+    "Description: A small REST service that records daily habits and streaks.\n\n"
+    "Tech Stack: Python, Flask, SQLite\n\n"
+    "Key Features:\n- Create habits\n- Check in daily\n- Streak statistics\n\n"
+    "```python\n@app.route('/habits')\ndef habits():\n    return jsonify([])\n```\n\n"
+    "Difficulty: Beginner, about a weekend."
+)
+
+
+class FakeGroqHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.2
+    jitter = 0.05
+    tokens_per_second = 200.0
+    reply = REPLY
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self.send_error(404)
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        model = body.get("model", "fake")
+        tokens = self.reply.split(" ")
+        usage = {
+            "prompt_tokens": sum(len(m.get("content", "")) for m in body.get("messages", [])) // 4,
+            "completion_tokens": len(tokens),
+            "total_tokens": 0
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if body.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i, token in enumerate(tokens):
+                chunk = {
+                    "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "delta": {"content": token if i == 0 else " " + token}, "finish_reason": None}]
+                }
+                self._write_chunk(f"data: {json.dumps(chunk)}\n\n")
+                time.sleep(1.0 / self.tokens_per_second)
+            final = {
+                "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "x_groq": {"id": completion_id, "usage": usage}
+            }
+            self._write_chunk(f"data: {json.dumps(final)}\n\n")
+            self._write_chunk("data: [DONE]\n\n")
+            self._write_chunk("")
+            return
+
+        # Non-streaming callers still wait for the whole reply to be "generated"
+        time.sleep(len(tokens) / self.tokens_per_second)
+        payload = json.dumps({
+            "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": self.reply}, "finish_reason": "stop"}],
+            "usage": usage
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _write_chunk(self, text):
+        data = text.encode()
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+
+def start_fake_groq(port=0, latency=0.2, jitter=0.05, tokens_per_second=200.0):
+    '''Start the fake server on a background thread and return (server, base_url)'''
+    handler = type("ConfiguredFakeGroqHandler", (FakeGroqHandler,), {
+        "latency": latency, "jitter": jitter, "tokens_per_second": tokens_per_second
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--tokens-per-second", type=float, default=200.0)
+    args = parser.parse_args()
+    server, url = start_fake_groq(args.port, args.latency, args.jitter, args.tokens_per_second)
+    print(f"Fake Groq listening on {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
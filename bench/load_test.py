@@ -0,0 +1,214 @@
+"""Reproducible load test for GenProject.
+
+Starts the app in-process against a throwaway SQLite database, with a fake
+Groq server standing in for the LLM. It then drives a number of virtual
+users, each of which registers, logs in, creates a project, loads /generate,
+chats (plain and streaming) and refreshes /history. It reports p50/p95/p99
+latency, throughput and SQL statements per request for each route.
+
+    python bench/load_test.py --users 20 --turns 3 --output bench_results.json
+    python bench/load_test.py --baseline bench_results.json --max-regression 0.2
+
+With --baseline the run exits non-zero if any route's p95 regresses by more
+than --max-regression. Sessions still need Redis, so REDIS_URL must point at
+a reachable server.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+from collections import defaultdict
+
+import httpx
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench.fake_groq import start_fake_groq  # noqa: E402
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="GenProject load test")
+    parser.add_argument("--users", type=int, default=10, help="concurrent virtual users")
+    parser.add_argument("--turns", type=int, default=3, help="chat turns per user")
+    parser.add_argument("--history-refreshes", type=int, default=3, help="/history calls per chat turn")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="fake LLM time to first token, seconds")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=200.0)
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--baseline", help="JSON results from an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed relative p95 increase")
+    return parser.parse_args(argv)
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def timed(self, route, fn):
+        started = time.perf_counter()
+        try:
+            response = fn()
+        except httpx.HTTPError:
+            with self._lock:
+                self.errors[route] += 1
+            raise
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.samples[route].append(elapsed)
+            if response.status_code >= 400:
+                self.errors[route] += 1
+        return response
+
+    def add(self, route, elapsed):
+        with self._lock:
+            self.samples[route].append(elapsed)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def prepare_app(groq_url, db_path):
+    os.environ["DATABASE_URL"] = f"sqlite:///{db_path}"
+    os.environ["GROQ_BASE_URL"] = groq_url
+    os.environ.setdefault("GROQ_API_KEY", "bench")
+    os.environ.setdefault("SECRET_KEY", "bench")
+    os.environ["FLASK_SECURE_COOKIES"] = "0"
+
+    import app as genproject
+
+    flask_app = genproject.create_app()
+    flask_app.config["WTF_CSRF_ENABLED"] = False
+    genproject.limiter.enabled = False
+    with flask_app.app_context():
+        genproject.db.create_all()
+    return flask_app
+
+
+def start_app(args, groq_url, db_path):
+    from werkzeug.serving import make_server
+
+    flask_app = prepare_app(groq_url, db_path)
+    server = make_server("127.0.0.1", 0, flask_app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return flask_app, server, f"http://127.0.0.1:{server.server_port}"
+
+
+def virtual_user(index, base_url, args, recorder):
+    username = f"bench{index}_{os.getpid()}_{int(time.time() * 1000)}"
+    with httpx.Client(base_url=base_url, timeout=60) as client:
+        recorder.timed("register", lambda: client.post("/register", data={"name": "Bench", "username": username, "password": "benchpass"}))
+        recorder.timed("login", lambda: client.post("/login", data={"username": username, "password": "benchpass"}))
+        public_id = recorder.timed("create_project", lambda: client.post("/create_project", json={"topic": "Untitled Project"})).json()["public_id"]
+        recorder.timed("get_generate", lambda: client.get("/generate"))
+
+        for turn in range(args.turns):
+            message = {"message": f"Suggest a project about topic {index}-{turn}", "project_id": public_id}
+            if turn % 2 == 0:
+                recorder.timed("chat", lambda: client.post("/chat", json=message))
+            else:
+                started = time.perf_counter()
+                first_token = None
+                with client.stream("POST", "/chat/stream", json=message) as response:
+                    for line in response.iter_lines():
+                        if first_token is None and line.startswith("data:"):
+                            first_token = time.perf_counter() - started
+                recorder.add("chat_stream", time.perf_counter() - started)
+                if first_token is not None:
+                    recorder.add("chat_stream (first token)", first_token)
+
+            recorder.timed("project_messages", lambda: client.get(f"/projects/{public_id}/messages"))
+            for _ in range(args.history_refreshes):
+                recorder.timed("history", lambda: client.get("/history"))
+        recorder.timed("get_generate", lambda: client.get("/generate"))
+
+
+def sql_per_request(metrics_module):
+    stats = {}
+    for (endpoint,), (_, total, count) in metrics_module.DB_QUERIES_PER_REQUEST._values.items():
+        # Endpoints are blueprint-qualified ("main.chat"); routes are reported by view name
+        stats[endpoint.rpartition(".")[2]] = total / count if count else 0.0
+    return stats
+
+
+def summarize(recorder, duration, sql_stats):
+    routes = {}
+    for route, values in sorted(recorder.samples.items()):
+        routes[route] = {
+            "count": len(values),
+            "errors": recorder.errors.get(route, 0),
+            "p50_ms": round(percentile(values, 50) * 1000, 2),
+            "p95_ms": round(percentile(values, 95) * 1000, 2),
+            "p99_ms": round(percentile(values, 99) * 1000, 2),
+            "throughput_rps": round(len(values) / duration, 2),
+            "sql_per_request": round(sql_stats[route], 2) if route in sql_stats else None
+        }
+    total = sum(len(v) for v in recorder.samples.values())
+    return {"duration_s": round(duration, 2), "requests": total, "throughput_rps": round(total / duration, 2), "routes": routes}
+
+
+def find_regressions(results, baseline, max_regression, noise_floor_ms=5.0):
+    regressions = []
+    for route, current in results["routes"].items():
+        previous = baseline.get("routes", {}).get(route)
+        if not previous:
+            continue
+        limit = previous["p95_ms"] * (1 + max_regression)
+        if current["p95_ms"] > limit and current["p95_ms"] - previous["p95_ms"] > noise_floor_ms:
+            regressions.append(f"{route}: p95 {previous['p95_ms']}ms -> {current['p95_ms']}ms")
+        if previous.get("sql_per_request") is not None and (current.get("sql_per_request") or 0) > previous["sql_per_request"]:
+            regressions.append(f"{route}: SQL/request {previous['sql_per_request']} -> {current['sql_per_request']}")
+    return regressions
+
+
+def print_report(results):
+    print(f"{'route':<28}{'count':>7}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rps':>8}{'sql/req':>9}")
+    for route, r in results["routes"].items():
+        sql = "" if r["sql_per_request"] is None else r["sql_per_request"]
+        print(f"{route:<28}{r['count']:>7}{r['errors']:>5}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['throughput_rps']:>8}{sql:>9}")
+    print(f"\n{results['requests']} requests in {results['duration_s']}s ({results['throughput_rps']} req/s)")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    fake_server, groq_url = start_fake_groq(latency=args.llm_latency, tokens_per_second=args.llm_tokens_per_second)
+    db_dir = tempfile.mkdtemp(prefix="genproject-bench-")
+    _, server, base_url = start_app(args, groq_url, os.path.join(db_dir, "bench.db"))
+
+    recorder = Recorder()
+    started = time.perf_counter()
+    threads = [threading.Thread(target=virtual_user, args=(i, base_url, args, recorder)) for i in range(args.users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - started
+
+    import metrics
+    results = summarize(recorder, duration, sql_per_request(metrics))
+    server.shutdown()
+    fake_server.shutdown()
+    print_report(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = find_regressions(results, json.load(f), args.max_regression)
+        if regressions:
+            print("\nRegressions:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+"""How many Redis and database round trips does an authenticated request make?
+
+Signs one user in and sends a mix of authenticated GETs (/history, a
+project's messages, /generate) through the test client. This runs once with
+NEAR_CACHE=0 and once with NEAR_CACHE=1. It counts the Redis commands issued
+by redis-py and the SQL statements run per request, and reports latency
+percentiles. --redis-latency adds that many seconds to every Redis command,
+to stand in for a Redis in another region.
+
+    python bench/near_cache.py --requests 200 --redis-latency 0.02
+    python bench/near_cache.py --output near_cache.json
+
+Each mode runs in a fresh interpreter because the near cache reads its
+settings at import. Rate limiting is switched off, so the only Redis commands
+counted are for sessions and cache invalidation. REDIS_URL must point at a
+reachable server, as for the load test.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MODES = {"off": "0", "on": "1"}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="GenProject near-cache benchmark")
+    parser.add_argument("--requests", type=int, default=200, help="authenticated GETs per mode")
+    parser.add_argument("--redis-latency", type=float, default=0.0, help="seconds added to every Redis command")
+    parser.add_argument("--output", help="write results as JSON to this path")
+    parser.add_argument("--run-mode", choices=MODES, help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def run_mode(args):
+    os.environ["NEAR_CACHE"] = MODES[args.run_mode]
+    import redis
+    from sqlalchemy import event
+    from bench.load_test import prepare_app, percentile
+
+    redis_commands = []
+    execute_command = redis.Redis.execute_command
+
+    def counted(self, *command, **options):
+        redis_commands.append(command[0])
+        if args.redis_latency:
+            time.sleep(args.redis_latency)
+        return execute_command(self, *command, **options)
+
+    redis.Redis.execute_command = counted
+
+    import app as genproject
+    db_path = os.path.join(tempfile.mkdtemp(prefix="genproject-near-"), "bench.db")
+    flask_app = prepare_app("http://127.0.0.1:9", db_path)
+    client = flask_app.test_client()
+    username = f"near{os.getpid()}"
+    client.post("/register", data={"name": "Bench", "username": username, "password": "benchpass"})
+    client.post("/login", data={"username": username, "password": "benchpass"})
+    public_id = client.post("/create_project", json={"topic": "Near cache"}).get_json()["public_id"]
+    # Consume the login flash so the measured requests leave the session unmodified
+    client.get("/generate")
+
+    statements = []
+    with flask_app.app_context():
+        event.listen(genproject.db.engine, "before_cursor_execute", lambda *a: statements.append(a[2]))
+
+    urls = ["/history", f"/projects/{public_id}/messages", "/generate"]
+    redis_commands.clear()
+    latencies = []
+    for i in range(args.requests):
+        started = time.perf_counter()
+        response = client.get(urls[i % len(urls)])
+        latencies.append(time.perf_counter() - started)
+        assert response.status_code == 200, response.status_code
+
+    return {
+        "redis_per_request": round(len(redis_commands) / args.requests, 3),
+        "sql_per_request": round(len(statements) / args.requests, 3),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+    }
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.run_mode:
+        print(json.dumps(run_mode(args)))
+        return 0
+
+    os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+    results = {}
+    for mode in MODES:
+        command = [sys.executable, os.path.abspath(__file__), "--run-mode", mode, "--requests", str(args.requests),
+                   "--redis-latency", str(args.redis_latency)]
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"{'NEAR_CACHE':<12}{'redis/req':>10}{'sql/req':>9}{'p50 ms':>9}{'p95 ms':>9}")
+    for mode, r in results.items():
+        print(f"{mode:<12}{r['redis_per_request']:>10}{r['sql_per_request']:>9}{r['p50_ms']:>9}{r['p95_ms']:>9}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
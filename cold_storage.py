@@ -0,0 +1,82 @@
+import os
+import zlib
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+COMPRESSION_LEVEL = 6
+
+
+def compress(value):
+    return zlib.compress(value.encode("utf-8"), COMPRESSION_LEVEL)
+
+
+def decompress(blob):
+    return zlib.decompress(blob).decode("utf-8")
+
+
+class Compactor:
+    '''Background job that moves old chat messages into compressed cold storage.
+
+    With COMPACTION=1 a daemon thread wakes every COMPACT_INTERVAL seconds and
+    calls compact_fn until no message older than COMPACT_AFTER_DAYS and at
+    least COMPACT_MIN_BYTES long is left uncompressed, COMPACT_BATCH rows at a
+    time. compact_fn does the database work and returns
+    (rows, bytes_before, bytes_after) for one batch. `flask compact-messages`
+    runs the same loop once, for a scheduler instead of the web processes.
+    '''
+
+    def __init__(self):
+        self.enabled = os.getenv("COMPACTION", "0") == "1"
+        self.after_days = float(os.getenv("COMPACT_AFTER_DAYS", "30"))
+        self.interval = float(os.getenv("COMPACT_INTERVAL", "3600"))
+        self.batch_size = int(os.getenv("COMPACT_BATCH", "500"))
+        self.min_bytes = int(os.getenv("COMPACT_MIN_BYTES", "256"))
+        self.compact_fn = None
+        self.totals = {"rows": 0, "bytes_before": 0, "bytes_after": 0}
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def cutoff(self, after_days=None):
+        return datetime.now() - timedelta(days=self.after_days if after_days is None else after_days)
+
+    def run_once(self, after_days=None):
+        '''Compact every eligible message; returns this run's totals'''
+        before = self.cutoff(after_days)
+        run = {"rows": 0, "bytes_before": 0, "bytes_after": 0}
+        while True:
+            rows, bytes_before, bytes_after = self.compact_fn(before, self.batch_size, self.min_bytes)
+            run["rows"] += rows
+            run["bytes_before"] += bytes_before
+            run["bytes_after"] += bytes_after
+            if rows < self.batch_size:
+                break
+        with self._lock:
+            for key, value in run.items():
+                self.totals[key] += value
+        return run
+
+    def ensure_started(self):
+        if not self.enabled or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name="message-compactor", daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                run = self.run_once()
+                if run["rows"]:
+                    logger.info(f"Compacted {run['rows']} messages: {run['bytes_before']} -> {run['bytes_after']} bytes")
+            except Exception as e:
+                logger.warning(f"Message compaction failed, will retry: {e}")
+
+
+compactor = Compactor()
@@ -0,0 +1,170 @@
+import os
+import sys
+import queue
+import pickle
+import struct
+import logging
+import threading
+import subprocess
+
+from werkzeug.security import generate_password_hash, check_password_hash
+from lazy import lazy_import
+
+bleach = lazy_import("bleach")
+markdown = lazy_import("markdown")
+
+logger = logging.getLogger(__name__)
+
+
+# Task functions live here rather than in app.py so pool workers only import this module
+def hash_password(password):
+    return generate_password_hash(password, method='pbkdf2:sha256')
+
+
+def verify_password(pwhash, password):
+    return check_password_hash(pwhash, password)
+
+
+def render_markdown(content, extra_tags, extra_attributes):
+    html = markdown.markdown(content, extensions=["fenced_code", "tables", "codehilite"])
+    tags = bleach.sanitizer.ALLOWED_TAGS.union(extra_tags)
+    attributes = {**bleach.sanitizer.ALLOWED_ATTRIBUTES, **extra_attributes}
+    return bleach.clean(html, tags=tags, attributes=attributes, strip=True)
+
+
+def _write_frame(stream, payload):
+    stream.write(struct.pack("!I", len(payload)) + payload)
+    stream.flush()
+
+
+def _read_frame(stream):
+    header = stream.read(4)
+    if len(header) < 4:
+        return None
+    return stream.read(struct.unpack("!I", header)[0])
+
+
+def worker_main():
+    '''Loop of a pool worker process: read (fn, args) frames from stdin, write results to stdout'''
+    stdin, stdout = sys.stdin.buffer, sys.stdout.buffer
+    # Lower priority so request handling wins when workers share cores with the web process
+    os.nice(int(os.getenv("CPU_POOL_NICE", "10")))
+    # Stray prints from task code must not corrupt the frame stream
+    sys.stdout = sys.stderr
+    while True:
+        frame = _read_frame(stdin)
+        if frame is None:
+            return
+        fn, args = pickle.loads(frame)
+        try:
+            result = (True, fn(*args))
+        except Exception as e:
+            result = (False, e)
+        _write_frame(stdout, pickle.dumps(result))
+
+
+class WorkerProcess:
+    def __init__(self):
+        module_dir = os.path.dirname(os.path.abspath(__file__))
+        self.proc = subprocess.Popen(
+            [sys.executable, "-c", f"import sys; sys.path.insert(0, {module_dir!r}); import cpu_pool; cpu_pool.worker_main()"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE
+        )
+
+    def call(self, fn, args):
+        _write_frame(self.proc.stdin, pickle.dumps((fn, args)))
+        frame = _read_frame(self.proc.stdout)
+        if frame is None:
+            raise BrokenPipeError("CPU pool worker exited")
+        # (ok, value): a task's own exception comes back as a value, so the caller can return the worker first
+        return pickle.loads(frame)
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+
+
+class CPUPool:
+    '''Runs CPU-bound calls off the request's event loop.
+
+    CPU_POOL selects how: "process" (default) hands them to long-lived
+    worker processes over pipes, "thread" uses real OS threads (eventlet's
+    tpool under the eventlet worker), which only helps code that releases the
+    GIL such as hashlib's pbkdf2, and "inline" runs them in the caller.
+    Waiting on a pipe or tpool yields to the eventlet hub, where
+    concurrent.futures' process pool would deadlock under monkey-patching.
+
+    Each lane has its own workers so a burst of logins never queues the
+    markdown render a chat reply is waiting on: CPU_POOL_SIZE processes for
+    the default lane and CPU_POOL_RENDER_SIZE for "render". Workers run at
+    CPU_POOL_NICE niceness and are started lazily in each process, so forked
+    servers get their own.
+    '''
+
+    def __init__(self):
+        self.kind = os.getenv("CPU_POOL", "process")
+        self.sizes = {
+            "default": int(os.getenv("CPU_POOL_SIZE", "2")),
+            "render": int(os.getenv("CPU_POOL_RENDER_SIZE", "1"))
+        }
+        self._lanes = {}
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _workers(self, lane):
+        if self._pid != os.getpid() or lane not in self._lanes:
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._lanes = {}
+                    self._pid = os.getpid()
+                if lane not in self._lanes:
+                    idle = queue.Queue()
+                    for _ in range(self.sizes[lane]):
+                        idle.put(WorkerProcess())
+                    self._lanes[lane] = idle
+        return self._lanes[lane]
+
+    def run(self, fn, *args, lane="default"):
+        if self.kind == "inline":
+            return fn(*args)
+
+        if self.kind == "thread":
+            eventlet = sys.modules.get("eventlet")
+            if eventlet is not None and eventlet.patcher.is_monkey_patched("thread"):
+                from eventlet import tpool
+                return tpool.execute(fn, *args)
+            return fn(*args)
+
+        idle = self._workers(lane)
+        worker = idle.get()
+        try:
+            ok, value = worker.call(fn, args)
+        except (BrokenPipeError, EOFError, pickle.UnpicklingError) as e:
+            # A worker died (OOM, killed); replace it and answer this call inline
+            logger.warning(f"CPU pool worker failed, running the call inline: {e}")
+            worker.close()
+            idle.put(WorkerProcess())
+            return fn(*args)
+        except BaseException:
+            # Interrupted mid-call, its pipe may still hold a stale reply: replace rather than reuse it
+            worker.close()
+            idle.put(WorkerProcess())
+            raise
+        idle.put(worker)
+        if not ok:
+            raise value
+        return value
+
+    def shutdown(self):
+        if self._pid == os.getpid():
+            for idle in self._lanes.values():
+                while not idle.empty():
+                    idle.get_nowait().close()
+        self._lanes = {}
+        self._pid = None
+
+
+cpu_pool = CPUPool()
@@ -0,0 +1,100 @@
+import os
+import time
+import logging
+import threading
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+
+class DatabaseHealth:
+    '''Background liveness prober that keeps a cached view of database health.
+
+    A single daemon thread (a green thread under the eventlet worker) runs
+    ``SELECT 1`` every DB_HEALTH_INTERVAL seconds, or every
+    DB_HEALTH_RETRY_INTERVAL seconds while the database is down. Requests only
+    read the cached state, so they never pay for a probe round trip. The state
+    starts out healthy so a fresh worker serves requests straight away, and
+    report_failure() lets request code flip it as soon as a connection fails.
+    '''
+
+    def __init__(self, interval=None, retry_interval=None):
+        self.interval = interval or float(os.getenv("DB_HEALTH_INTERVAL", "30"))
+        self.retry_interval = retry_interval or float(os.getenv("DB_HEALTH_RETRY_INTERVAL", "2"))
+        self.healthy = True
+        self.last_checked = None
+        self.last_error = None
+        self._engine_getter = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+
+    def init_app(self, app, engine_getter):
+        self._engine_getter = lambda: self._with_context(app, engine_getter)
+        app.extensions["db_health"] = self
+
+    @staticmethod
+    def _with_context(app, engine_getter):
+        with app.app_context():
+            return engine_getter()
+
+    def ensure_started(self):
+        # Started lazily per process so a forked worker never inherits a dead thread
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._wake = threading.Event()
+            self._thread = threading.Thread(target=self._run, name="db-health", daemon=True)
+            self._thread.start()
+
+    def probe(self):
+        try:
+            with self._engine_getter().connect() as conn:
+                conn.execute(text("SELECT 1"))
+        except Exception as e:
+            if self.healthy:
+                logger.warning(f"Database is waking up or unreachable: {e}")
+            self.healthy = False
+            self.last_error = str(e)
+        else:
+            if not self.healthy:
+                logger.info("Database is reachable again")
+            self.healthy = True
+            self.last_error = None
+        self.last_checked = time.time()
+        return self.healthy
+
+    def report_failure(self, error):
+        '''Mark the database down after a request lost its connection and re-probe immediately.
+
+        Returns False, leaving the state alone, for errors of the query itself.
+        '''
+        if not is_connection_failure(error):
+            return False
+        self.healthy = False
+        self.last_error = str(error)
+        self._wake.set()
+        return True
+
+    def _run(self):
+        while True:
+            self.probe()
+            self._wake.wait(self.interval if self.healthy else self.retry_interval)
+            self._wake.clear()
+
+
+def is_connection_failure(error):
+    '''True if the database could not be reached, rather than a query failing on it.
+
+    SQLAlchemy flags a dropped connection as connection_invalidated, and a
+    failed connect carries no statement. Locks, deadlocks, statement timeouts
+    and missing tables are OperationalErrors too, but the database is up.
+    '''
+    return bool(getattr(error, "connection_invalidated", False)) or getattr(error, "statement", None) is None
+
+
+db_health = DatabaseHealth()
@@ -0,0 +1,151 @@
+import os
+import gzip
+import hashlib
+from functools import lru_cache
+from flask import request, current_app
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "6"))
+COMPRESSIBLE_TYPES = ("application/json", "text/html", "text/css", "text/javascript", "application/javascript", "text/plain")
+STATIC_MAX_AGE = 365 * 24 * 3600
+
+# (path, encoding) -> ((mtime, size), compressed bytes) for static files, so each version is compressed once
+_compressed = {}
+
+
+def make_etag(*parts):
+    '''A short validator from the values a response depends on'''
+    return hashlib.blake2b(repr(parts).encode("utf-8"), digest_size=12).hexdigest()
+
+
+def is_fresh(etag):
+    '''True if the client already holds the representation with this ETag'''
+    return request.if_none_match.contains_weak(etag)
+
+
+def revalidate(response, etag):
+    '''Tag a per-user response so the browser keeps it but checks back each time'''
+    response.set_etag(etag, weak=True)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+def not_modified(etag):
+    return revalidate(current_app.response_class(status=304), etag)
+
+
+@lru_cache(maxsize=None)
+def asset_version(path):
+    '''Content hash of a static file, used as its ?v= fingerprint'''
+    try:
+        with open(path, "rb") as f:
+            return hashlib.blake2b(f.read(), digest_size=6).hexdigest()
+    except OSError:
+        return None
+
+
+@lru_cache(maxsize=None)
+def release(*directories):
+    '''Hash of every template and static file, so a deploy invalidates rendered pages'''
+    digest = hashlib.blake2b(digest_size=6)
+    for directory in directories:
+        for root, _, files in sorted(os.walk(directory)):
+            for name in sorted(files):
+                with open(os.path.join(root, name), "rb") as f:
+                    digest.update(f.read())
+    return digest.hexdigest()
+
+
+def accepted_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+
+def compress_response(response, static_path=None):
+    # Generators (SSE, the export) stream as produced; only send_file's file wrappers are read here
+    streamed = response.is_streamed and not response.direct_passthrough
+    if response.status_code != 200 or streamed or "Content-Encoding" in response.headers:
+        return response
+    if response.mimetype not in COMPRESSIBLE_TYPES:
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding = accepted_encoding()
+    if encoding is None:
+        return response
+
+    response.direct_passthrough = False
+    stamp = None
+    if static_path is not None:
+        stat = os.stat(static_path)
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        cached = _compressed.get((static_path, encoding))
+        if cached is not None and cached[0] == stamp:
+            # Close send_file's file wrapper, which get_data() would otherwise have read and closed
+            close = getattr(response.response, "close", None)
+            if close is not None:
+                close()
+            response.set_data(cached[1])
+            response.headers["Content-Encoding"] = encoding
+            return weaken_etag(response)
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+    if encoding == "br":
+        data = brotli.compress(data, quality=min(COMPRESS_LEVEL, 11))
+    else:
+        data = gzip.compress(data, compresslevel=COMPRESS_LEVEL, mtime=0)
+    if stamp is not None:
+        _compressed[(static_path, encoding)] = (stamp, data)
+    response.set_data(data)
+    response.headers["Content-Encoding"] = encoding
+    return weaken_etag(response)
+
+
+def weaken_etag(response):
+    # A strong ETag names exact bytes; the compressed body is a different representation
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
+
+def init_app(app):
+    '''Fingerprint static URLs, cache them for a year, and compress large text responses.
+
+    url_for('static', ...) gains a ?v=<content hash>, so a fingerprinted asset
+    can be cached as immutable and a changed file gets a new URL. JSON, HTML,
+    CSS and JS bodies of at least COMPRESS_MIN_SIZE bytes are sent with
+    brotli (if installed) or gzip. Streamed responses such as SSE and the
+    export are left alone.
+    '''
+
+    @app.url_defaults
+    def fingerprint_static(endpoint, values):
+        if endpoint == "static" and "filename" in values and "v" not in values:
+            version = asset_version(os.path.join(app.static_folder, values["filename"]))
+            if version:
+                values["v"] = version
+
+    @app.after_request
+    def cache_and_compress(response):
+        if request.endpoint != "static" or response.status_code != 200:
+            return compress_response(response)
+        path = os.path.join(app.static_folder, request.view_args["filename"])
+        # Only the current fingerprint is immutable; a stale or made-up ?v= gets the default revalidation
+        if request.args.get("v") and request.args.get("v") == asset_version(path):
+            response.cache_control.no_cache = None
+            response.cache_control.public = True
+            response.cache_control.max_age = STATIC_MAX_AGE
+            response.cache_control.immutable = True
+        return compress_response(response, static_path=path)
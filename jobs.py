@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import uuid
+import queue
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY = "jobs:generation"
+JOB_KEY_PREFIX = "jobs:status:"
+
+
+class JobQueueFull(Exception):
+    '''Raised when the local job queue cannot take more work'''
+
+
+class JobQueue:
+    '''Queue of generation jobs with per-job status records.
+
+    With JOB_BACKEND=redis jobs are pushed onto a Redis list and consumed by
+    ``flask generation-worker`` processes, so generation scales separately from
+    the web workers. The default local backend is a stand-in that runs
+    JOB_WORKERS threads inside each web process. Either way the status record
+    (queued, running, done or failed, plus the result) is kept for JOB_TTL
+    seconds so clients can poll for it after a dropped connection. Records
+    live in Redis whenever REDIS_URL is set, so a poll can land on any web
+    worker, and only fall back to process memory without it.
+    '''
+
+    def __init__(self, backend=None, workers=None, max_size=None, ttl=None):
+        self.backend = backend or os.getenv("JOB_BACKEND", "local")
+        self.shared_status = self.backend == "redis" or bool(os.getenv("REDIS_URL"))
+        self.workers = workers or int(os.getenv("JOB_WORKERS", "2"))
+        self.max_size = max_size or int(os.getenv("JOB_QUEUE_SIZE", "100"))
+        self.ttl = ttl or int(os.getenv("JOB_TTL", "3600"))
+        self.handler = None
+        self._redis = None
+        self._queue = queue.Queue(maxsize=self.max_size)
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._threads = []
+        self._pid = None
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            import redis
+            self._redis = redis.from_url(os.getenv("REDIS_URL"))
+        return self._redis
+
+    def _save(self, job):
+        job["updated_at"] = time.time()
+        if self.shared_status:
+            self.redis.set(JOB_KEY_PREFIX + job["id"], json.dumps(job), ex=self.ttl)
+            return
+        with self._lock:
+            self._jobs[job["id"]] = job
+            expired = [k for k, v in self._jobs.items() if v["updated_at"] < time.time() - self.ttl]
+            for key in expired:
+                del self._jobs[key]
+
+    def get(self, job_id):
+        if self.shared_status:
+            raw = self.redis.get(JOB_KEY_PREFIX + job_id)
+            return json.loads(raw) if raw else None
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def enqueue(self, payload, owner):
+        job = {"id": uuid.uuid4().hex, "owner": owner, "status": "queued", "payload": payload, "result": None, "error": None}
+        if self.backend == "redis":
+            self._save(job)
+            self.redis.lpush(QUEUE_KEY, job["id"])
+            return job["id"]
+
+        self.ensure_started()
+        self._save(job)
+        try:
+            self._queue.put_nowait(job["id"])
+        except queue.Full:
+            self._forget(job["id"])
+            raise JobQueueFull("Generation queue is full")
+        return job["id"]
+
+    def _forget(self, job_id):
+        if self.shared_status:
+            self.redis.delete(JOB_KEY_PREFIX + job_id)
+            return
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def run(self, job_id):
+        job = self.get(job_id)
+        if job is None:
+            return
+        job["status"] = "running"
+        self._save(job)
+        try:
+            job["result"] = self.handler(job["payload"])
+            job["status"] = "done"
+        except Exception as e:
+            logger.exception(f"Generation job {job_id} failed")
+            job["status"] = "failed"
+            job["error"] = str(e)
+        self._save(job)
+
+    def ensure_started(self):
+        # Local worker threads are started per process so forked web workers get their own
+        if self.backend != "local" or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            # A queue made before the fork (or before monkey-patching) would block the hub when waited on
+            self._queue = queue.Queue(maxsize=self.max_size)
+            self._threads = [
+                threading.Thread(target=self._local_worker, name=f"job-worker-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def _local_worker(self):
+        while True:
+            job_id = self._queue.get()
+            try:
+                self.run(job_id)
+            finally:
+                self._queue.task_done()
+
+    def work_forever(self):
+        '''Consume the Redis queue; run by ``flask generation-worker``'''
+        logger.info("Generation worker waiting for jobs")
+        while True:
+            item = self.redis.brpop(QUEUE_KEY, timeout=5)
+            if item:
+                self.run(item[1].decode())
+
+
+job_queue = JobQueue()
@@ -0,0 +1,40 @@
+import importlib
+import threading
+
+_lock = threading.Lock()
+
+
+class LazyModule:
+    '''Stand-in for a module that is imported on first attribute access.
+
+    The import runs under a lock, and importlib's own import lock covers the
+    module body, so request threads touching it for the first time together
+    all wait for one fully initialised module. (importlib's LazyLoader hands
+    the others a half-initialised one.)
+    '''
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        with _lock:
+            if self._module is None:
+                self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        module = self._module or self._load()
+        return getattr(module, attr)
+
+    def __repr__(self):
+        return f"<lazy module {self._name!r}>"
+
+
+def lazy_import(name):
+    '''Return a module that is only really imported on first attribute access.
+
+    Keeps heavy modules that most requests never touch (bleach, markdown and
+    its pygments highlighter) off the cold-start path.
+    '''
+    return LazyModule(name)
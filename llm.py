@@ -0,0 +1,310 @@
+import os
+import sys
+import json
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+from dotenv import load_dotenv
+from metrics import LLM_HEDGES, LLM_WINS, record_llm_usage
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+
+class LLMBusyError(Exception):
+    '''Raised when the in-flight cap is reached and the wait queue is full or timed out'''
+
+
+def cooperative_sleep(seconds):
+    '''Sleep without blocking the eventlet hub when running under the eventlet worker'''
+    # Only consult eventlet if the worker already loaded it; importing it here is not free
+    eventlet = sys.modules.get("eventlet")
+    if eventlet is not None and eventlet.patcher.is_monkey_patched("time"):
+        eventlet.sleep(seconds)
+    else:
+        time.sleep(seconds)
+
+
+DEFAULT_MODEL = "llama-3.1-8b-instant"
+
+
+class Provider:
+    '''One upstream model endpoint reachable through the Groq SDK.
+
+    ``base_url`` lets any Groq/OpenAI-compatible server (including the bench
+    stub) stand in, and ``api_key_env`` names the variable holding its key.
+    Recent time-to-first-token samples drive the hedging deadline.
+    '''
+
+    def __init__(self, name, model, base_url=None, api_key_env="GROQ_API_KEY", timeout=30):
+        self.name = name
+        self.model = model
+        self.base_url = base_url
+        self.api_key_env = api_key_env
+        self.timeout = timeout
+        self.first_token_times = deque(maxlen=200)
+        self._client = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        # Created on first use so importing the app never opens upstream connections
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from groq import Groq
+                    # Retries are handled by the callers, so the SDK's own are disabled
+                    self._client = Groq(
+                        api_key=os.getenv(self.api_key_env),
+                        base_url=self.base_url,
+                        timeout=self.timeout,
+                        max_retries=0
+                    )
+        return self._client
+
+    def hedge_delay(self, percentile, default, minimum):
+        '''Seconds to wait for a first token before hedging, from this provider's recent history'''
+        samples = sorted(self.first_token_times)
+        if len(samples) < 20:
+            return default
+        return max(minimum, samples[max(0, int(len(samples) * percentile / 100) - 1)])
+
+
+def load_providers(timeout):
+    '''Read LLM_PROVIDERS, a JSON list of {"name", "model", "base_url"?, "api_key_env"?}, primary first'''
+    raw = os.getenv("LLM_PROVIDERS")
+    if not raw:
+        return [Provider("groq", DEFAULT_MODEL, timeout=timeout)]
+    return [Provider(timeout=timeout, **entry) for entry in json.loads(raw)]
+
+
+def close_stream(stream):
+    close = getattr(stream, "close", None)
+    if close is None:
+        return
+    try:
+        close()
+    except Exception as e:
+        logger.debug(f"Closing an LLM stream failed: {e}")
+
+
+class LLMClient:
+    '''Lazily constructed upstream clients with a cap on concurrent calls.
+
+    Callers take a slot with ``with llm.slot():`` around each upstream call;
+    stream_completion() takes its own, one per attempt. At most ``max_inflight`` calls run at once, up to ``max_queue`` more wait
+    for ``queue_timeout`` seconds, and anything beyond that is rejected with
+    LLMBusyError instead of piling up greenlets behind a slow upstream.
+
+    stream_completion() hedges across the configured providers: if the current
+    one has produced no token by its LLM_HEDGE_PERCENTILE first-token latency,
+    the next provider is started too, the first to produce output wins and the
+    others' connections are closed. A provider that fails outright fails over
+    at once. Each attempt holds a slot until its connection ends, and a hedge
+    is put off while no slot is free, so hedging never goes past the cap.
+    '''
+
+    def __init__(self, max_inflight=None, max_queue=None, queue_timeout=None, call_timeout=None):
+        self.max_inflight = max_inflight or int(os.getenv("LLM_MAX_INFLIGHT", "8"))
+        self.max_queue = max_queue if max_queue is not None else int(os.getenv("LLM_MAX_QUEUE", "32"))
+        self.queue_timeout = queue_timeout or float(os.getenv("LLM_QUEUE_TIMEOUT", "10"))
+        self.call_timeout = call_timeout or float(os.getenv("LLM_TIMEOUT", "30"))
+        self.hedging = os.getenv("LLM_HEDGE", "1") == "1"
+        self.hedge_percentile = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+        self.hedge_default_delay = float(os.getenv("LLM_HEDGE_DELAY", "2"))
+        self.hedge_min_delay = float(os.getenv("LLM_HEDGE_MIN_DELAY", "0.3"))
+        self.providers = load_providers(self.call_timeout)
+        self._slots = None
+        self._lock = None
+        self._pid = None
+        self._init_lock = threading.Lock()
+        self.inflight = 0
+        self.waiting = 0
+
+    @property
+    def primary(self):
+        return self.providers[0]
+
+    @property
+    def client(self):
+        return self.primary.client
+
+    def _process_slots(self):
+        # Built per process, after the eventlet worker has monkey-patched, so waiting stays cooperative
+        if self._pid != os.getpid():
+            with self._init_lock:
+                if self._pid != os.getpid():
+                    self._slots = threading.BoundedSemaphore(self.max_inflight)
+                    self._lock = threading.Lock()
+                    self.inflight = 0
+                    self.waiting = 0
+                    self._pid = os.getpid()
+        return self._slots
+
+    def reset(self):
+        '''Forget upstream clients and slots inherited across a fork; each process builds its own'''
+        for provider in self.providers:
+            provider._client = None
+        self._pid = None
+
+    @contextmanager
+    def slot(self):
+        self.acquire_slot()
+        try:
+            yield self.client
+        finally:
+            self.release_slot()
+
+    def acquire_slot(self):
+        '''Wait for a slot, or raise LLMBusyError; give it back with release_slot()'''
+        slots = self._process_slots()
+        if not slots.acquire(blocking=False):
+            with self._lock:
+                if self.waiting >= self.max_queue:
+                    raise LLMBusyError("LLM wait queue is full")
+                self.waiting += 1
+            try:
+                acquired = slots.acquire(timeout=self.queue_timeout)
+            finally:
+                with self._lock:
+                    self.waiting -= 1
+            if not acquired:
+                raise LLMBusyError("Timed out waiting for an LLM slot")
+
+        with self._lock:
+            self.inflight += 1
+
+    def try_slot(self):
+        '''Take a slot only if one is free right now; give it back with release_slot()'''
+        if not self._process_slots().acquire(blocking=False):
+            return False
+        with self._lock:
+            self.inflight += 1
+        return True
+
+    def release_slot(self):
+        with self._lock:
+            self.inflight -= 1
+        self._slots.release()
+
+    def _hedge_deadline(self, launched):
+        if not self.hedging or len(launched) >= len(self.providers):
+            return None
+        provider = self.providers[len(launched) - 1]
+        return launched[-1] + provider.hedge_delay(self.hedge_percentile, self.hedge_default_delay, self.hedge_min_delay)
+
+    def stream_completion(self, messages, kind="stream", **params):
+        '''Yield reply tokens from whichever provider produces output first'''
+        events = queue.Queue()
+        cancelled = set()
+        streams = {}
+        launched = []
+        live = set()
+
+        def attempt(index):
+            provider = self.providers[index]
+            outcome = ("done", None)
+            try:
+                stream = provider.client.chat.completions.create(
+                    model=provider.model,
+                    messages=messages,
+                    stream=True,
+                    **params
+                )
+                streams[index] = stream
+                try:
+                    # Cancelled while connecting: the loop below may never see a chunk to stop at
+                    if index in cancelled:
+                        return
+                    for chunk in stream:
+                        if index in cancelled:
+                            return
+                        # Groq reports usage on the final chunk under x_groq
+                        usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+                        if usage is not None:
+                            events.put((index, "usage", usage))
+                        if chunk.choices and chunk.choices[0].delta.content:
+                            events.put((index, "token", chunk.choices[0].delta.content))
+                finally:
+                    close_stream(stream)
+            except Exception as e:
+                outcome = ("error", e)
+            finally:
+                self.release_slot()
+            # Sent after the slot is back, so a failover can take it
+            events.put((index, *outcome))
+
+        def launch():
+            index = len(launched)
+            launched.append(time.perf_counter())
+            live.add(index)
+            if index:
+                LLM_HEDGES.inc(provider=self.providers[index].name)
+            threading.Thread(
+                target=attempt, args=(index,), name=f"llm-{self.providers[index].name}", daemon=True
+            ).start()
+
+        def cancel(indexes):
+            cancelled.update(indexes)
+            # Closing the response drops the connection even if its reader is stalled waiting for a chunk
+            for index in indexes:
+                stream = streams.get(index)
+                if stream is not None:
+                    close_stream(stream)
+
+        self.acquire_slot()
+        launch()
+        winner = None
+        hedge_after = 0.0
+        try:
+            while True:
+                deadline = self._hedge_deadline(launched) if winner is None else None
+                try:
+                    timeout = None if deadline is None else max(0.0, max(deadline, hedge_after) - time.perf_counter())
+                    index, event, value = events.get(timeout=timeout)
+                except queue.Empty:
+                    if self.try_slot():
+                        logger.info(f"Hedging to {self.providers[len(launched)].name}: no output yet")
+                        launch()
+                    else:
+                        # Every slot is taken, so a hedge would go past LLM_MAX_INFLIGHT; check again shortly
+                        hedge_after = time.perf_counter() + self.hedge_min_delay
+                    continue
+
+                if winner is not None and index != winner:
+                    continue
+                if event == "token":
+                    if winner is None:
+                        winner = index
+                        self.providers[index].first_token_times.append(time.perf_counter() - launched[index])
+                        LLM_WINS.inc(provider=self.providers[index].name)
+                        cancel([i for i in range(len(launched)) if i != index])
+                    yield value
+                elif event == "usage":
+                    record_llm_usage(kind, value)
+                elif winner is not None:
+                    if event == "error":
+                        raise value
+                    return
+                else:
+                    # This provider failed or returned nothing before anyone produced output
+                    live.discard(index)
+                    # Alone, the failover queues for a slot like any call; beside a running hedge it only takes a free one
+                    if len(launched) < len(self.providers) and (not live or self.try_slot()):
+                        logger.warning(f"Failing over from {self.providers[index].name}: {value or 'empty response'}")
+                        if not live:
+                            self.acquire_slot()
+                        launch()
+                    elif not live:
+                        if event == "error":
+                            raise value
+                        return
+        finally:
+            cancel(range(len(launched)))
+
+
+llm = LLMClient()
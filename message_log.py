@@ -0,0 +1,225 @@
+import os
+import json
+import uuid
+import fcntl
+import logging
+import threading
+from datetime import datetime
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = "chat:message_log"
+FLUSH_LOCK_KEY = "chat:message_log:flush_lock"
+# Hash of one conversation's pending entries (log_id -> entry), so readers never scan the stream
+CONVERSATION_KEY = "chat:message_log:conversation:{user_id}:{project_id}"
+
+# Drop the flush lock only if it still holds our token, not one a later flusher took after ours expired
+RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+def conversation_key(entry):
+    return CONVERSATION_KEY.format(user_id=entry["user_id"], project_id=entry["project_id"])
+
+
+class LoggedMessage:
+    '''A chat message that is acknowledged but not yet in the database'''
+
+    def __init__(self, entry):
+        self.id = None
+        self.log_id = entry["log_id"]
+        self.user_id = entry["user_id"]
+        self.project_id = entry["project_id"]
+        self.role = entry["role"]
+        self.content = entry["content"]
+        self.html = entry.get("html")
+        self.timestamp = datetime.fromisoformat(entry["timestamp"])
+        self.stream_id = None
+
+
+class MessageLog:
+    '''Optional write-behind log for chat messages (WRITE_BEHIND=1).
+
+    Messages are appended to a Redis stream, or with WRITE_BEHIND_BACKEND=local
+    to an fsynced append-only file, and acknowledged straight away. A
+    background flusher bulk-inserts them into chat_message in batches of
+    WRITE_BEHIND_BATCH every WRITE_BEHIND_INTERVAL seconds. Each entry
+    carries a log_id stored on the row, so replaying after a crash or a failed
+    flush never duplicates messages. Readers merge pending() entries with
+    database rows to keep read-your-writes.
+
+    The Redis backend also indexes pending entries per conversation, so
+    pending() reads one small hash. The local file and its pending view
+    belong to one process: a second process that finds the file locked
+    refuses to start rather than overwrite entries it cannot see.
+    '''
+
+    def __init__(self):
+        self.enabled = os.getenv("WRITE_BEHIND", "0") == "1"
+        self.backend = os.getenv("WRITE_BEHIND_BACKEND", "redis" if os.getenv("REDIS_URL") else "local")
+        self.path = os.getenv("WRITE_BEHIND_LOG", "chat_messages.log")
+        self.batch_size = int(os.getenv("WRITE_BEHIND_BATCH", "200"))
+        self.interval = float(os.getenv("WRITE_BEHIND_INTERVAL", "0.5"))
+        self.flush_fn = None
+        self._pending = OrderedDict()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._redis = None
+        self._pid = None
+        self._lock_file = None
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            import redis
+            self._redis = redis.from_url(os.getenv("REDIS_URL"))
+            self._release_lock_script = self._redis.register_script(RELEASE_LOCK_SCRIPT)
+        return self._redis
+
+    def append(self, user_id, project_id, role, content, html=None):
+        entry = {
+            "log_id": uuid.uuid4().hex,
+            "user_id": user_id,
+            "project_id": project_id,
+            "role": role,
+            "content": content,
+            "html": html,
+            "timestamp": datetime.now().isoformat()
+        }
+        self.ensure_started()
+        logged = LoggedMessage(entry)
+        if self.backend == "redis":
+            data = json.dumps(entry)
+            with self.redis.pipeline() as pipe:
+                pipe.xadd(STREAM_KEY, {"entry": data})
+                pipe.hset(conversation_key(entry), entry["log_id"], data)
+                logged.stream_id = pipe.execute()[0]
+        else:
+            with self._lock:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._pending[entry["log_id"]] = entry
+                if len(self._pending) >= self.batch_size:
+                    self._wake.set()
+        return logged
+
+    def discard(self, message):
+        '''Drop an appended message that has not been flushed yet'''
+        if self.backend == "redis":
+            with self.redis.pipeline() as pipe:
+                pipe.xdel(STREAM_KEY, message.stream_id)
+                pipe.hdel(CONVERSATION_KEY.format(user_id=message.user_id, project_id=message.project_id), message.log_id)
+                pipe.execute()
+            return
+        with self._lock:
+            if self._pending.pop(message.log_id, None) is not None:
+                self._rewrite()
+
+    def _read_redis(self, count=None):
+        return [(stream_id, json.loads(fields[b"entry"])) for stream_id, fields in self.redis.xrange(STREAM_KEY, count=count)]
+
+    def pending(self, user_id, project_id):
+        '''Unflushed messages for one conversation, oldest first'''
+        if self.backend == "redis":
+            key = CONVERSATION_KEY.format(user_id=user_id, project_id=project_id)
+            entries = sorted((json.loads(data) for data in self.redis.hvals(key)), key=lambda e: e["timestamp"])
+        else:
+            with self._lock:
+                entries = [e for e in self._pending.values() if e["user_id"] == user_id and e["project_id"] == project_id]
+        return [LoggedMessage(e) for e in entries]
+
+    def flush(self):
+        '''Write one batch to the database; returns the number of entries flushed'''
+        if self.backend == "redis":
+            # One flusher at a time across processes keeps batches in log order
+            token = uuid.uuid4().hex
+            if not self.redis.set(FLUSH_LOCK_KEY, token, nx=True, ex=30):
+                return 0
+            try:
+                batch = self._read_redis(count=self.batch_size)
+                if batch:
+                    self.flush_fn([entry for _, entry in batch])
+                    with self.redis.pipeline() as pipe:
+                        pipe.xdel(STREAM_KEY, *[stream_id for stream_id, _ in batch])
+                        for _, entry in batch:
+                            pipe.hdel(conversation_key(entry), entry["log_id"])
+                        pipe.execute()
+                return len(batch)
+            finally:
+                self._release_lock_script(keys=[FLUSH_LOCK_KEY], args=[token])
+
+        with self._lock:
+            batch = list(self._pending.values())[:self.batch_size]
+        if not batch:
+            return 0
+        self.flush_fn(batch)
+        with self._lock:
+            for entry in batch:
+                self._pending.pop(entry["log_id"], None)
+            # Rewrite the file with whatever is still unflushed so it never grows unbounded
+            self._rewrite()
+        return len(batch)
+
+    def _rewrite(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            for entry in self._pending.values():
+                f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def ensure_started(self):
+        if not self.enabled or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self.backend == "local":
+                self._lock_local_log()
+            self._pid = os.getpid()
+            self._wake = threading.Event()
+            if self.backend == "local" and os.path.exists(self.path):
+                # Replay entries acknowledged before a restart; log_id dedupe makes this safe
+                with open(self.path, encoding="utf-8") as f:
+                    for line in f:
+                        if line.strip():
+                            entry = json.loads(line)
+                            self._pending[entry["log_id"]] = entry
+            threading.Thread(target=self._run, name="message-log-flusher", daemon=True).start()
+
+    def _lock_local_log(self):
+        # Held for the life of the process; the OS drops it when the process exits, so a restart can replay
+        lock_file = open(f"{self.path}.lock", "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            raise RuntimeError(
+                f"{self.path} is in use by another process. WRITE_BEHIND_BACKEND=local supports a single "
+                "process; use the redis backend with several workers."
+            )
+        self._lock_file = lock_file
+
+    def _run(self):
+        failures = 0
+        while True:
+            # Back off while the database is unreachable instead of retrying every interval
+            self._wake.wait(min(30, self.interval * 2 ** failures))
+            self._wake.clear()
+            try:
+                while self.flush() >= self.batch_size:
+                    pass
+                failures = 0
+            except Exception as e:
+                # The database may be asleep; entries stay in the log until the next attempt
+                failures = min(failures + 1, 6)
+                logger.warning(f"Write-behind flush failed, will retry: {e}")
+
+
+message_log = MessageLog()
@@ -0,0 +1,175 @@
+import time
+import threading
+from flask import g, request, has_app_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self._lock:
+            entry = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                for bound, bucket_count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', bound)])} {bucket_count}")
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, [('le', '+Inf')])} {count}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+
+    def counter(self, *args, **kwargs):
+        metric = Counter(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def histogram(self, *args, **kwargs):
+        metric = Histogram(*args, **kwargs)
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        for collect in self.collectors:
+            lines.extend(collect())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+HTTP_LATENCY = registry.histogram(
+    "http_request_duration_seconds", "Time to build the response, per endpoint.", ("endpoint", "method", "status"))
+DB_QUERIES_PER_REQUEST = registry.histogram(
+    "db_queries_per_request", "SQL statements executed per request.", ("endpoint",), buckets=COUNT_BUCKETS)
+DB_TIME_PER_REQUEST = registry.histogram(
+    "db_time_per_request_seconds", "Time spent in SQL statements per request.", ("endpoint",))
+DB_QUERY_LATENCY = registry.histogram(
+    "db_query_duration_seconds", "Latency of individual SQL statements.")
+LLM_LATENCY = registry.histogram(
+    "llm_request_duration_seconds", "Latency of upstream LLM calls.", ("kind", "outcome"))
+LLM_FIRST_TOKEN = registry.histogram(
+    "llm_time_to_first_token_seconds", "Time from the streaming request to its first token.")
+LLM_RETRIES = registry.counter(
+    "llm_retries_total", "Upstream LLM attempts beyond the first.", ("kind",))
+LLM_ERRORS = registry.counter(
+    "llm_errors_total", "Failed upstream LLM attempts by exception class.", ("kind", "error_class"))
+LLM_HEDGES = registry.counter(
+    "llm_hedged_requests_total", "Hedged or failover requests sent to a secondary provider.", ("provider",))
+LLM_WINS = registry.counter(
+    "llm_provider_wins_total", "Completions served by each provider.", ("provider",))
+LLM_TOKENS = registry.counter(
+    "llm_tokens_total", "Tokens reported by the upstream LLM.", ("kind", "type"))
+NEAR_CACHE_LOOKUPS = registry.counter(
+    "near_cache_lookups_total", "In-process cache lookups for sessions.", ("kind", "outcome"))
+USER_QUOTA_WAIT = registry.histogram(
+    "user_quota_wait_seconds", "Time a generation waited in its user's queue before starting.")
+USER_QUOTA_REJECTIONS = registry.counter(
+    "user_quota_rejections_total", "Generations refused by the per-user quota.", ("reason",))
+
+
+def record_llm_usage(kind, usage):
+    if usage is None:
+        return
+    for token_type in ("prompt_tokens", "completion_tokens"):
+        value = getattr(usage, token_type, None)
+        if value:
+            LLM_TOKENS.inc(value, kind=kind, type=token_type.replace("_tokens", ""))
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    DB_QUERY_LATENCY.observe(elapsed)
+    if has_app_context() and "metrics_queries" in g:
+        g.metrics_queries += 1
+        g.metrics_query_time += elapsed
+
+
+def init_app(app):
+    '''Record request latency and per-request SQL counts for every non-static route'''
+    # Listeners are global to every Engine, so a second app must not add them again
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_start = time.perf_counter()
+        g.metrics_queries = 0
+        g.metrics_query_time = 0.0
+
+    @app.after_request
+    def record_request_metrics(response):
+        if "metrics_start" not in g or request.endpoint in (None, "static"):
+            return response
+        endpoint = request.endpoint
+        HTTP_LATENCY.observe(time.perf_counter() - g.metrics_start, endpoint=endpoint, method=request.method, status=response.status_code)
+        DB_QUERIES_PER_REQUEST.observe(g.metrics_queries, endpoint=endpoint)
+        DB_TIME_PER_REQUEST.observe(g.metrics_query_time, endpoint=endpoint)
+        return response
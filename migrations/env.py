@@ -90,9 +90,22 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
+    # full-text search objects are created by hand (see search.py), so
+    # autogenerate must not offer to drop them
+    def include_object(object, name, type_, reflected, compare_to):
+        if type_ == 'table' and '_fts' in name:
+            return False
+        if type_ == 'column' and name == 'search_vector':
+            return False
+        if type_ == 'index' and name.endswith('_search'):
+            return False
+        return True
+
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    if conf_args.get("include_object") is None:
+        conf_args["include_object"] = include_object
 
     connectable = get_engine()
 
@@ -0,0 +1,123 @@
+"""Add compressed cold storage columns to chat_message
+
+Revision ID: 2f7c8e4b9a61
+Revises: 9d3b6a1f5e28
+Create Date: 2026-10-18 18:40:12.905117
+
+"""
+import zlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2f7c8e4b9a61'
+down_revision = '9d3b6a1f5e28'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('chat_message', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('content_z', sa.LargeBinary(), nullable=True))
+        batch_op.add_column(sa.Column('html_z', sa.LargeBinary(), nullable=True))
+        batch_op.create_index(
+            'ix_chat_message_uncompacted', ['timestamp', 'id'], unique=False,
+            postgresql_where=sa.text('content_z IS NULL'),
+            sqlite_where=sa.text('content_z IS NULL')
+        )
+
+    # Compaction empties content, so the search index must stop deriving from it
+    if op.get_bind().dialect.name == 'postgresql':
+        # zlib output does not compress further; skip TOAST's own attempt
+        op.execute("ALTER TABLE chat_message ALTER COLUMN content_z SET STORAGE EXTERNAL")
+        op.execute("ALTER TABLE chat_message ALTER COLUMN html_z SET STORAGE EXTERNAL")
+        # Existing vectors are kept; from now on a trigger maintains them
+        op.execute("ALTER TABLE chat_message ALTER COLUMN search_vector DROP EXPRESSION")
+        op.execute(
+            "CREATE FUNCTION chat_message_search_vector() RETURNS trigger AS $$ BEGIN "
+            "IF NEW.content_z IS NULL THEN NEW.search_vector := to_tsvector('english', coalesce(NEW.content, '')); END IF; "
+            "RETURN NEW; END $$ LANGUAGE plpgsql"
+        )
+        op.execute(
+            "CREATE TRIGGER chat_message_search_vector BEFORE INSERT OR UPDATE OF content ON chat_message "
+            "FOR EACH ROW EXECUTE FUNCTION chat_message_search_vector()"
+        )
+        return
+
+    # Replace the external-content FTS table with one that keeps its own copy of the text
+    for trigger in ('chat_message_fts_au', 'chat_message_fts_ad', 'chat_message_fts_ai'):
+        op.execute(f"DROP TRIGGER {trigger}")
+    op.execute("DROP TABLE chat_message_fts")
+    op.execute("CREATE VIRTUAL TABLE chat_message_fts USING fts5(content, tokenize='porter unicode61')")
+    op.execute(
+        "CREATE TRIGGER chat_message_fts_ai AFTER INSERT ON chat_message BEGIN "
+        "INSERT INTO chat_message_fts(rowid, content) VALUES (new.id, new.content); END"
+    )
+    op.execute(
+        "CREATE TRIGGER chat_message_fts_ad AFTER DELETE ON chat_message BEGIN "
+        "DELETE FROM chat_message_fts WHERE rowid = old.id; END"
+    )
+    op.execute(
+        "CREATE TRIGGER chat_message_fts_au AFTER UPDATE OF content ON chat_message WHEN new.content_z IS NULL BEGIN "
+        "DELETE FROM chat_message_fts WHERE rowid = old.id; "
+        "INSERT INTO chat_message_fts(rowid, content) VALUES (new.id, new.content); END"
+    )
+    op.execute("INSERT INTO chat_message_fts(rowid, content) SELECT id, content FROM chat_message")
+
+
+def downgrade():
+    bind = op.get_bind()
+    # Put compacted text back before its columns go away
+    rows = bind.execute(sa.text("SELECT id, content_z, html_z FROM chat_message WHERE content_z IS NOT NULL")).fetchall()
+    for row in rows:
+        bind.execute(
+            sa.text("UPDATE chat_message SET content = :content, html = :html, content_z = NULL, html_z = NULL WHERE id = :id"),
+            {
+                "id": row.id,
+                "content": zlib.decompress(row.content_z).decode('utf-8'),
+                "html": zlib.decompress(row.html_z).decode('utf-8') if row.html_z is not None else None
+            }
+        )
+
+    if bind.dialect.name == 'postgresql':
+        op.execute("DROP TRIGGER chat_message_search_vector ON chat_message")
+        op.execute("DROP FUNCTION chat_message_search_vector()")
+        op.execute("DROP INDEX ix_chat_message_search")
+        op.execute("ALTER TABLE chat_message DROP COLUMN search_vector")
+        op.execute(
+            "ALTER TABLE chat_message ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+            "to_tsvector('english', coalesce(content, ''))) STORED"
+        )
+        op.execute("CREATE INDEX ix_chat_message_search ON chat_message USING gin (search_vector)")
+    else:
+        for trigger in ('chat_message_fts_au', 'chat_message_fts_ad', 'chat_message_fts_ai'):
+            op.execute(f"DROP TRIGGER {trigger}")
+        op.execute("DROP TABLE chat_message_fts")
+
+    with op.batch_alter_table('chat_message', schema=None) as batch_op:
+        batch_op.drop_index('ix_chat_message_uncompacted')
+        batch_op.drop_column('html_z')
+        batch_op.drop_column('content_z')
+
+    if bind.dialect.name == 'sqlite':
+        # Dropping columns rebuilt chat_message; recreate the previous revision's search objects
+        op.execute(
+            "CREATE VIRTUAL TABLE chat_message_fts USING fts5("
+            "content, content='chat_message', content_rowid='id', tokenize='porter unicode61')"
+        )
+        op.execute(
+            "CREATE TRIGGER chat_message_fts_ai AFTER INSERT ON chat_message BEGIN "
+            "INSERT INTO chat_message_fts(rowid, content) VALUES (new.id, new.content); END"
+        )
+        op.execute(
+            "CREATE TRIGGER chat_message_fts_ad AFTER DELETE ON chat_message BEGIN "
+            "INSERT INTO chat_message_fts(chat_message_fts, rowid, content) VALUES ('delete', old.id, old.content); END"
+        )
+        op.execute(
+            "CREATE TRIGGER chat_message_fts_au AFTER UPDATE OF content ON chat_message BEGIN "
+            "INSERT INTO chat_message_fts(chat_message_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+            "INSERT INTO chat_message_fts(rowid, content) VALUES (new.id, new.content); END"
+        )
+        op.execute("INSERT INTO chat_message_fts(chat_message_fts) VALUES ('rebuild')")
@@ -0,0 +1,85 @@
+"""Add full-text search over project ideas and chat messages
+
+Revision ID: 9d3b6a1f5e28
+Revises: 5c2e9f07a3d1
+Create Date: 2026-10-18 17:02:44.381206
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '9d3b6a1f5e28'
+down_revision = '5c2e9f07a3d1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        # Adding a stored generated column computes it for every existing row, which is the backfill
+        op.execute(
+            "ALTER TABLE project_idea ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+            "setweight(to_tsvector('english', coalesce(topic, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(content, '')), 'B')) STORED"
+        )
+        op.execute("CREATE INDEX ix_project_idea_search ON project_idea USING gin (search_vector)")
+        op.execute(
+            "ALTER TABLE chat_message ADD COLUMN search_vector tsvector GENERATED ALWAYS AS ("
+            "to_tsvector('english', coalesce(content, ''))) STORED"
+        )
+        op.execute("CREATE INDEX ix_chat_message_search ON chat_message USING gin (search_vector)")
+        return
+
+    op.execute(
+        "CREATE VIRTUAL TABLE project_idea_fts USING fts5("
+        "topic, content, content='project_idea', content_rowid='id', tokenize='porter unicode61')"
+    )
+    op.execute(
+        "CREATE TRIGGER project_idea_fts_ai AFTER INSERT ON project_idea BEGIN "
+        "INSERT INTO project_idea_fts(rowid, topic, content) VALUES (new.id, new.topic, new.content); END"
+    )
+    op.execute(
+        "CREATE TRIGGER project_idea_fts_ad AFTER DELETE ON project_idea BEGIN "
+        "INSERT INTO project_idea_fts(project_idea_fts, rowid, topic, content) VALUES ('delete', old.id, old.topic, old.content); END"
+    )
+    op.execute(
+        "CREATE TRIGGER project_idea_fts_au AFTER UPDATE OF topic, content ON project_idea BEGIN "
+        "INSERT INTO project_idea_fts(project_idea_fts, rowid, topic, content) VALUES ('delete', old.id, old.topic, old.content); "
+        "INSERT INTO project_idea_fts(rowid, topic, content) VALUES (new.id, new.topic, new.content); END"
+    )
+    op.execute(
+        "CREATE VIRTUAL TABLE chat_message_fts USING fts5("
+        "content, content='chat_message', content_rowid='id', tokenize='porter unicode61')"
+    )
+    op.execute(
+        "CREATE TRIGGER chat_message_fts_ai AFTER INSERT ON chat_message BEGIN "
+        "INSERT INTO chat_message_fts(rowid, content) VALUES (new.id, new.content); END"
+    )
+    op.execute(
+        "CREATE TRIGGER chat_message_fts_ad AFTER DELETE ON chat_message BEGIN "
+        "INSERT INTO chat_message_fts(chat_message_fts, rowid, content) VALUES ('delete', old.id, old.content); END"
+    )
+    op.execute(
+        "CREATE TRIGGER chat_message_fts_au AFTER UPDATE OF content ON chat_message BEGIN "
+        "INSERT INTO chat_message_fts(chat_message_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+        "INSERT INTO chat_message_fts(rowid, content) VALUES (new.id, new.content); END"
+    )
+    # Backfill rows written before the triggers existed
+    op.execute("INSERT INTO project_idea_fts(project_idea_fts) VALUES ('rebuild')")
+    op.execute("INSERT INTO chat_message_fts(chat_message_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP INDEX ix_chat_message_search")
+        op.execute("ALTER TABLE chat_message DROP COLUMN search_vector")
+        op.execute("DROP INDEX ix_project_idea_search")
+        op.execute("ALTER TABLE project_idea DROP COLUMN search_vector")
+        return
+
+    for trigger in ('chat_message_fts_au', 'chat_message_fts_ad', 'chat_message_fts_ai',
+                    'project_idea_fts_au', 'project_idea_fts_ad', 'project_idea_fts_ai'):
+        op.execute(f"DROP TRIGGER {trigger}")
+    op.execute("DROP TABLE chat_message_fts")
+    op.execute("DROP TABLE project_idea_fts")
@@ -0,0 +1,26 @@
+"""Add a (user_id, id) index on chat_message for the /history validator
+
+Revision ID: a3c7e91d5f20
+Revises: 6b1d4e8f2c57
+Create Date: 2026-10-18 15:02:44.193027
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c7e91d5f20'
+down_revision = '6b1d4e8f2c57'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('chat_message', schema=None) as batch_op:
+        batch_op.create_index('ix_chat_message_user_id', ['user_id', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('chat_message', schema=None) as batch_op:
+        batch_op.drop_index('ix_chat_message_user_id')
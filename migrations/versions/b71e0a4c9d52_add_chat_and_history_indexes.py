@@ -0,0 +1,36 @@
+"""Add composite indexes for the chat and history access paths
+
+Revision ID: b71e0a4c9d52
+Revises: 3f9c2b7d41e8
+Create Date: 2026-10-18 13:41:07.518230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b71e0a4c9d52'
+down_revision = '3f9c2b7d41e8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('chat_message', schema=None) as batch_op:
+        batch_op.create_index('ix_chat_message_user_project_id', ['user_id', 'project_id', 'id'], unique=False)
+
+    with op.batch_alter_table('project_idea', schema=None) as batch_op:
+        batch_op.create_index(
+            'ix_project_idea_user_timestamp', ['user_id', 'timestamp', 'id'], unique=False,
+            postgresql_where=sa.text('public_id IS NOT NULL'),
+            sqlite_where=sa.text('public_id IS NOT NULL')
+        )
+
+
+def downgrade():
+    with op.batch_alter_table('project_idea', schema=None) as batch_op:
+        batch_op.drop_index('ix_project_idea_user_timestamp')
+
+    with op.batch_alter_table('chat_message', schema=None) as batch_op:
+        batch_op.drop_index('ix_chat_message_user_project_id')
@@ -0,0 +1,185 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from flask_session import Session
+from flask_session.defaults import Defaults
+from flask_session.redis import RedisSessionInterface
+from metrics import NEAR_CACHE_LOOKUPS
+
+logger = logging.getLogger(__name__)
+
+INVALIDATE_CHANNEL = "near_cache:invalidate"
+
+
+class NearCache:
+    '''In-process copy of hot Redis reads, kept for a few seconds.
+
+    Every authenticated request loads its session from Redis. With
+    NEAR_CACHE=1 (the default) values read in the last NEAR_CACHE_TTL seconds
+    are served from memory, up to NEAR_CACHE_MAX_ENTRIES of them. Redis stays
+    the source of truth. A process that changes a value publishes its key on
+    a Redis channel and every process drops its copy. The TTL bounds how
+    stale a copy can get if a message is missed.
+    '''
+
+    def __init__(self):
+        self.enabled = os.getenv("NEAR_CACHE", "1") == "1"
+        self.ttl = float(os.getenv("NEAR_CACHE_TTL", "5"))
+        self.max_entries = int(os.getenv("NEAR_CACHE_MAX_ENTRIES", "10000"))
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._redis = None
+        self._pid = None
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            import redis
+            self._redis = redis.from_url(os.getenv("REDIS_URL"))
+        return self._redis
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        kind = key.split(":", 1)[0]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(key)
+                value = entry[0]
+            else:
+                value = None
+        NEAR_CACHE_LOOKUPS.inc(kind=kind, outcome="miss" if value is None else "hit")
+        return value
+
+    def set(self, key, value):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def invalidate(self, key):
+        '''Drop a key here and, through Redis, in every other process'''
+        self.discard(key)
+        if not self.enabled:
+            return
+        try:
+            self.redis.publish(INVALIDATE_CHANNEL, key)
+        except Exception as e:
+            logger.warning(f"Could not publish near-cache invalidation, other processes expire it within {self.ttl}s: {e}")
+
+    def ensure_started(self):
+        if not self.enabled or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            # Entries copied from the parent were never covered by this process's subscription
+            self._entries.clear()
+            threading.Thread(target=self._listen, name="near-cache-invalidation", daemon=True).start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATE_CHANNEL)
+                # Whatever was published while unsubscribed has been missed
+                self.clear()
+                for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self.discard(message["data"].decode())
+            except Exception as e:
+                logger.warning(f"Near-cache invalidation channel lost, resubscribing: {e}")
+                self.clear()
+                time.sleep(1)
+
+
+near_cache = NearCache()
+
+
+class NearCachedRedisSessionInterface(RedisSessionInterface):
+    '''Flask-Session's Redis store with the near cache in front of it.
+
+    Sessions are read from the near cache when possible. Saving an unmodified
+    session only pushes back its expiry in Redis, at most once every
+    SESSION_REFRESH_INTERVAL seconds per process. So a request that only
+    reads its session usually makes no Redis round trip. Changed and
+    deleted sessions (login, logout, flashed messages) are invalidated in
+    every process.
+    '''
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.refresh_interval = float(os.getenv("SESSION_REFRESH_INTERVAL", "60"))
+        self._refreshed = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _retrieve_session_data(self, store_id):
+        near_cache.ensure_started()
+        data = near_cache.get(store_id)
+        if data is None:
+            data = self.client.get(store_id)
+            if data is None:
+                return None
+            near_cache.set(store_id, data)
+        return self.serializer.decode(data)
+
+    def _upsert_session(self, session_lifetime, session, store_id):
+        now = time.monotonic()
+        lifetime = int(session_lifetime.total_seconds())
+        if session.modified:
+            data = self.serializer.encode(session)
+            self.client.set(name=store_id, value=data, ex=lifetime)
+            near_cache.invalidate(store_id)
+            near_cache.set(store_id, data)
+        else:
+            with self._lock:
+                refreshed = self._refreshed.get(store_id)
+            if refreshed is not None and now - refreshed < self.refresh_interval:
+                return
+            # Only push back the expiry: rewriting a copy that may be a few seconds old could undo another process's change
+            self.client.expire(store_id, lifetime)
+
+        with self._lock:
+            self._refreshed[store_id] = now
+            self._refreshed.move_to_end(store_id)
+            while len(self._refreshed) > near_cache.max_entries:
+                self._refreshed.popitem(last=False)
+
+    def _delete_session(self, store_id):
+        super()._delete_session(store_id)
+        with self._lock:
+            self._refreshed.pop(store_id, None)
+        near_cache.invalidate(store_id)
+
+
+class NearCachedSession(Session):
+    '''Flask-Session, using NearCachedRedisSessionInterface for Redis sessions when the near cache is on'''
+
+    def _get_interface(self, app):
+        config = app.config
+        if not near_cache.enabled or config.get("SESSION_TYPE", Defaults.SESSION_TYPE).lower() != "redis":
+            return super()._get_interface(app)
+        return NearCachedRedisSessionInterface(
+            app=app,
+            client=config.get("SESSION_REDIS", Defaults.SESSION_REDIS),
+            key_prefix=config.get("SESSION_KEY_PREFIX", Defaults.SESSION_KEY_PREFIX),
+            use_signer=config.get("SESSION_USE_SIGNER", Defaults.SESSION_USE_SIGNER),
+            permanent=config.get("SESSION_PERMANENT", Defaults.SESSION_PERMANENT),
+            sid_length=config.get("SESSION_ID_LENGTH", Defaults.SESSION_ID_LENGTH),
+            serialization_format=config.get("SESSION_SERIALIZATION_FORMAT", Defaults.SESSION_SERIALIZATION_FORMAT),
+        )
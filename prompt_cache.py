@@ -0,0 +1,193 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from llm import cooperative_sleep
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "prompt_cache:v1:"
+INDEX_KEY = "prompt_cache:index"
+STATS_KEY = "prompt_cache:stats"
+LOCK_PREFIX = "prompt_cache:lock:"
+
+
+def normalize_text(text):
+    return " ".join(text.split()).lower()
+
+
+class PromptCache:
+    '''Opt-in cache for first-turn replies with single-flight for identical prompts.
+
+    Entries live in Redis (or an in-process LRU when REDIS_URL is unset) with a
+    TTL, and the oldest entries are evicted once PROMPT_CACHE_MAX_ENTRIES is
+    exceeded. While one caller computes a reply, identical requests in this
+    process wait on it and other processes poll for the result behind a Redis
+    lock, so a burst of the same topic costs a single upstream call.
+    '''
+
+    def __init__(self, enabled=None, ttl=None, max_entries=None, wait_timeout=None):
+        self.enabled = enabled if enabled is not None else os.getenv("PROMPT_CACHE_ENABLED", "0") == "1"
+        self.ttl = ttl or int(os.getenv("PROMPT_CACHE_TTL", "86400"))
+        self.max_entries = max_entries or int(os.getenv("PROMPT_CACHE_MAX_ENTRIES", "1000"))
+        self.wait_timeout = wait_timeout or float(os.getenv("PROMPT_CACHE_WAIT_TIMEOUT", "30"))
+        self.counters = {"hits": 0, "misses": 0, "coalesced": 0}
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._memory = OrderedDict()
+        self._redis = None
+        self._redis_url = os.getenv("REDIS_URL")
+
+    @property
+    def redis(self):
+        if self._redis is None and self._redis_url:
+            import redis
+            self._redis = redis.from_url(self._redis_url)
+        return self._redis
+
+    def _redis_call(self, fn, default=None):
+        # The cache is an optimisation, so a Redis failure degrades to a miss
+        if not self.redis:
+            return default
+        try:
+            return fn(self.redis)
+        except Exception as e:
+            logger.warning(f"Prompt cache Redis error: {e}")
+            return default
+
+    def key_for(self, messages, params):
+        payload = json.dumps({
+            "messages": [{"role": m["role"], "content": normalize_text(m["content"])} for m in messages],
+            "params": params
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _incr(self, counter):
+        with self._lock:
+            self.counters[counter] += 1
+        self._redis_call(lambda r: r.hincrby(STATS_KEY, counter, 1))
+
+    def stats(self):
+        shared = self._redis_call(lambda r: r.hgetall(STATS_KEY))
+        if shared:
+            return {k.decode(): int(v) for k, v in shared.items()}
+        with self._lock:
+            return dict(self.counters)
+
+    def _get(self, key):
+        if self.redis:
+            value = self._redis_call(lambda r: r.get(KEY_PREFIX + key))
+            if value is not None:
+                self._redis_call(lambda r: r.zadd(INDEX_KEY, {key: time.time()}))
+                return value.decode("utf-8")
+            return None
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return value
+
+    def lookup(self, key):
+        value = self._get(key)
+        self._incr("hits" if value is not None else "misses")
+        return value
+
+    def store(self, key, value):
+        if self.redis:
+            def write(r):
+                now = time.time()
+                pipe = r.pipeline()
+                pipe.set(KEY_PREFIX + key, value, ex=self.ttl)
+                pipe.zadd(INDEX_KEY, {key: now})
+                pipe.zremrangebyscore(INDEX_KEY, 0, now - self.ttl)
+                pipe.zcard(INDEX_KEY)
+                size = pipe.execute()[-1]
+                if size > self.max_entries:
+                    evicted = [k.decode() for k, _ in r.zpopmin(INDEX_KEY, size - self.max_entries)]
+                    if evicted:
+                        r.delete(*[KEY_PREFIX + k for k in evicted])
+            self._redis_call(write)
+            return
+
+        with self._lock:
+            self._memory[key] = (time.time() + self.ttl, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def claim(self, key):
+        '''Return True if the caller should compute the value, False if another caller already is'''
+        with self._lock:
+            if key in self._inflight:
+                return False
+            self._inflight[key] = threading.Event()
+
+        lock_ttl = int(self.wait_timeout) + 1
+        if self._redis_call(lambda r: r.set(LOCK_PREFIX + key, "1", nx=True, ex=lock_ttl), default=True):
+            return True
+
+        # Another process holds the flight; local callers poll Redis like we do
+        self._release_local(key)
+        return False
+
+    def wait(self, key):
+        '''Wait for the caller that claimed ``key`` and return its value, or None on timeout/failure'''
+        self._incr("coalesced")
+        with self._lock:
+            event = self._inflight.get(key)
+        if event is not None:
+            event.wait(self.wait_timeout)
+            return self._get(key)
+
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            value = self._get(key)
+            if value is not None:
+                return value
+            if not self._redis_call(lambda r: r.exists(LOCK_PREFIX + key)):
+                return self._get(key)
+            cooperative_sleep(0.1)
+        return None
+
+    def release(self, key):
+        self._redis_call(lambda r: r.delete(LOCK_PREFIX + key))
+        self._release_local(key)
+
+    def _release_local(self, key):
+        with self._lock:
+            event = self._inflight.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def get_or_compute(self, messages, params, compute, should_cache=lambda value: True):
+        key = self.key_for(messages, params)
+        value = self.lookup(key)
+        if value is not None:
+            return value
+
+        if not self.claim(key):
+            value = self.wait(key)
+            if value is not None:
+                return value
+            # The leader failed or timed out, so this caller goes upstream itself
+            return compute()
+
+        try:
+            value = compute()
+            if should_cache(value):
+                self.store(key, value)
+            return value
+        finally:
+            self.release(key)
+
+
+prompt_cache = PromptCache()
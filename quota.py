@@ -0,0 +1,231 @@
+import os
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from llm import cooperative_sleep
+from metrics import USER_QUOTA_WAIT, USER_QUOTA_REJECTIONS
+
+KEY_PREFIX = "quota:"
+
+# One atomic step for a user's waiter: join the FIFO, then take a generation
+# slot and charge the token bucket only if it is at the head, under the
+# concurrency cap and the bucket holds enough tokens.
+# KEYS: inflight zset (member -> lease expiry), waiting zset (member -> arrival), bucket hash
+# ARGV: now, waiter, cost, max_concurrent, lease, queue_timeout, burst, refill per second
+ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local waiter = ARGV[2]
+local cost = tonumber(ARGV[3])
+local burst = tonumber(ARGV[7])
+local rate = tonumber(ARGV[8])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', now - tonumber(ARGV[6]) - 5)
+redis.call('ZADD', KEYS[2], 'NX', now, waiter)
+local head = redis.call('ZRANGE', KEYS[2], 0, 0)[1]
+if head ~= waiter then
+    return {0, 'queued', 0}
+end
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[4]) then
+    return {0, 'concurrency', 0}
+end
+local state = redis.call('HMGET', KEYS[3], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + (now - ts) * rate)
+if tokens < cost then
+    redis.call('HSET', KEYS[3], 'tokens', tostring(tokens), 'ts', tostring(now))
+    return {0, 'budget', tostring((cost - tokens) / rate)}
+end
+redis.call('HSET', KEYS[3], 'tokens', tostring(tokens - cost), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[3], math.ceil(burst / rate) + 60)
+redis.call('ZADD', KEYS[1], now + tonumber(ARGV[5]), waiter)
+redis.call('EXPIRE', KEYS[1], tonumber(ARGV[5]) + 60)
+redis.call('ZREM', KEYS[2], waiter)
+return {1, 'ok', 0}
+"""
+
+# Give back (or, if negative, take) tokens after the real size of a reply is known
+REFUND_SCRIPT = """
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+if state[1] then
+    local tokens = math.min(tonumber(ARGV[2]), tonumber(state[1]) + tonumber(ARGV[1]))
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens))
+end
+return 1
+"""
+
+
+class QuotaExceeded(Exception):
+    '''Raised when a generation can be neither started nor held in the queue'''
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Lease:
+    '''One admitted generation: its slot id and the tokens charged for it'''
+
+    def __init__(self, user_id, cost, id=None):
+        self.id = id or uuid.uuid4().hex
+        self.user_id = user_id
+        self.cost = cost
+
+    def to_dict(self):
+        return {"id": self.id, "user_id": self.user_id, "cost": self.cost}
+
+
+class UserQuota:
+    '''Per-user LLM budget and concurrency limits that queue before they reject.
+
+    Each user has a token bucket of USER_TOKEN_BURST estimated LLM tokens
+    that refills at USER_TOKENS_PER_MINUTE. At most USER_MAX_CONCURRENT of
+    their generations run at once. A generation that cannot start waits in
+    that user's FIFO queue for up to USER_QUEUE_TIMEOUT seconds, with at most
+    USER_MAX_QUEUED waiting. Past that, or if the bucket would not refill in
+    time, QuotaExceeded is raised with a Retry-After hint. One heavy user
+    therefore waits on their own budget instead of using up the shared
+    upstream quota.
+
+    QUOTA_BACKEND=redis (the default when REDIS_URL is set) keeps the state
+    in Redis, updated by Lua scripts so every web and generation worker sees
+    the same counts. "memory" keeps it per process, for local testing.
+    Slots are leases that expire after QUOTA_LEASE seconds, so a crashed
+    worker cannot hold them for ever.
+    '''
+
+    def __init__(self):
+        self.enabled = os.getenv("USER_QUOTA", "1") == "1"
+        self.backend = os.getenv("QUOTA_BACKEND", "redis" if os.getenv("REDIS_URL") else "memory")
+        self.burst = float(os.getenv("USER_TOKEN_BURST", "20000"))
+        self.rate = float(os.getenv("USER_TOKENS_PER_MINUTE", "6000")) / 60
+        self.max_concurrent = int(os.getenv("USER_MAX_CONCURRENT", "2"))
+        self.max_queued = int(os.getenv("USER_MAX_QUEUED", "4"))
+        self.queue_timeout = float(os.getenv("USER_QUEUE_TIMEOUT", "20"))
+        self.lease = float(os.getenv("QUOTA_LEASE", "180"))
+        self.poll_interval = 0.1
+        self._redis = None
+        self._lock = threading.Lock()
+        self._users = {}
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            import redis
+            self._redis = redis.from_url(os.getenv("REDIS_URL"))
+            self._acquire_script = self._redis.register_script(ACQUIRE_SCRIPT)
+            self._refund_script = self._redis.register_script(REFUND_SCRIPT)
+        return self._redis
+
+    def _keys(self, user_id):
+        return [f"{KEY_PREFIX}inflight:{user_id}", f"{KEY_PREFIX}waiting:{user_id}", f"{KEY_PREFIX}bucket:{user_id}"]
+
+    def _state(self, user_id):
+        state = self._users.get(user_id)
+        if state is None:
+            state = self._users[user_id] = {"inflight": {}, "waiting": OrderedDict(), "tokens": self.burst, "ts": time.time()}
+        return state
+
+    def _try_acquire(self, user_id, waiter, cost):
+        '''Returns (admitted, reason, seconds until the bucket covers cost)'''
+        now = time.time()
+        if self.backend == "redis":
+            client = self.redis
+            admitted, reason, retry_after = self._acquire_script(
+                keys=self._keys(user_id),
+                args=[now, waiter, cost, self.max_concurrent, self.lease, self.queue_timeout, self.burst, self.rate],
+                client=client
+            )
+            reason = reason.decode() if isinstance(reason, bytes) else reason
+            return bool(admitted), reason, float(retry_after)
+
+        with self._lock:
+            state = self._state(user_id)
+            state["inflight"] = {k: v for k, v in state["inflight"].items() if v > now}
+            state["waiting"].setdefault(waiter, now)
+            if next(iter(state["waiting"])) != waiter:
+                return False, "queued", 0.0
+            if len(state["inflight"]) >= self.max_concurrent:
+                return False, "concurrency", 0.0
+            tokens = min(self.burst, state["tokens"] + (now - state["ts"]) * self.rate)
+            state["tokens"], state["ts"] = tokens, now
+            if tokens < cost:
+                return False, "budget", (cost - tokens) / self.rate
+            state["tokens"] = tokens - cost
+            state["inflight"][waiter] = now + self.lease
+            del state["waiting"][waiter]
+            return True, "ok", 0.0
+
+    def _queued(self, user_id):
+        if self.backend == "redis":
+            return self.redis.zcount(self._keys(user_id)[1], time.time() - self.queue_timeout, "+inf")
+        with self._lock:
+            return len(self._state(user_id)["waiting"])
+
+    def _leave_queue(self, user_id, waiter):
+        if self.backend == "redis":
+            self.redis.zrem(self._keys(user_id)[1], waiter)
+            return
+        with self._lock:
+            self._state(user_id)["waiting"].pop(waiter, None)
+
+    def acquire(self, user_id, cost):
+        '''Wait for a generation slot and charge ``cost`` tokens; returns a Lease or None when disabled'''
+        if not self.enabled:
+            return None
+        cost = min(cost, self.burst)
+        lease = Lease(user_id, cost)
+        started = time.monotonic()
+        admitted, reason, retry_after = self._try_acquire(user_id, lease.id, cost)
+        if not admitted and self._queued(user_id) > self.max_queued:
+            self._leave_queue(user_id, lease.id)
+            return self._reject("queue_full", retry_after or self.queue_timeout)
+        try:
+            while not admitted:
+                remaining = self.queue_timeout - (time.monotonic() - started)
+                # Don't hold a request for tokens that will not arrive before it would give up anyway
+                if remaining <= 0 or (reason == "budget" and retry_after > remaining):
+                    return self._reject(reason, retry_after or self.queue_timeout)
+                cooperative_sleep(min(self.poll_interval, remaining))
+                admitted, reason, retry_after = self._try_acquire(user_id, lease.id, cost)
+        except BaseException:
+            self._leave_queue(user_id, lease.id)
+            raise
+        USER_QUOTA_WAIT.observe(time.monotonic() - started)
+        return lease
+
+    def _reject(self, reason, retry_after):
+        USER_QUOTA_REJECTIONS.inc(reason=reason)
+        raise QuotaExceeded(reason, max(1, int(retry_after + 0.999)))
+
+    def charge(self, user_id, tokens):
+        '''Take tokens spent outside a generation (the conversation summary) from the user's bucket'''
+        if not self.enabled or not tokens:
+            return
+        if self.backend == "redis":
+            client = self.redis
+            self._refund_script(keys=[self._keys(user_id)[2]], args=[-tokens, self.burst], client=client)
+            return
+        with self._lock:
+            state = self._state(user_id)
+            state["tokens"] = min(self.burst, state["tokens"] - tokens)
+
+    def release(self, lease, used_tokens=None):
+        '''Free the slot; with ``used_tokens``, refund what the estimate over-charged'''
+        if lease is None:
+            return
+        refund = lease.cost - used_tokens if used_tokens is not None else 0
+        if self.backend == "redis":
+            self.redis.zrem(self._keys(lease.user_id)[0], lease.id)
+            if refund:
+                self._refund_script(keys=[self._keys(lease.user_id)[2]], args=[refund, self.burst])
+            return
+        with self._lock:
+            state = self._state(lease.user_id)
+            state["inflight"].pop(lease.id, None)
+            state["tokens"] = min(self.burst, state["tokens"] + refund)
+
+
+user_quota = UserQuota()
@@ -0,0 +1,58 @@
+import os
+import sys
+import logging
+from flask import session, request, has_request_context
+from flask_socketio import SocketIO, join_room
+
+logger = logging.getLogger(__name__)
+
+REALTIME_ENABLED = os.getenv("REALTIME", "1") == "1"
+CHANNEL = "genproject-realtime"
+
+socketio = SocketIO()
+
+
+def user_room(user_id):
+    return f"user:{user_id}"
+
+
+def init_app(app):
+    '''Per-user Socket.IO channel that pushes project and chat changes to every open tab.
+
+    A signed-in browser joins its user's room on connect. Routes call
+    publish() after committing, so other tabs update without polling. With
+    REDIS_URL set, events go through a Redis message queue. Then an event
+    emitted by any web worker, or by `flask generation-worker`, reaches
+    sockets held by every other process. With REALTIME=0 there is no
+    channel, and a tab sees other tabs' changes only when it next fetches.
+    '''
+    app.context_processor(lambda: {"realtime": REALTIME_ENABLED})
+    if not REALTIME_ENABLED:
+        return
+    # gunicorn's eventlet worker imports eventlet before loading the app; `flask run` never does
+    async_mode = "eventlet" if "eventlet" in sys.modules else "threading"
+    # manage_session=False reads the Flask-Session store on connect, so the socket sees logins and logouts
+    socketio.init_app(
+        app, async_mode=async_mode, message_queue=os.getenv("REDIS_URL"), channel=CHANNEL, manage_session=False
+    )
+    socketio.on_event("connect", connect)
+
+
+def connect(auth=None):
+    user_id = session.get("user_id")
+    if not user_id:
+        return False
+    join_room(user_room(user_id))
+
+
+def publish(user_id, event, data, skip_sid=None):
+    '''Push an event to the user's tabs, except the one whose request caused it'''
+    if not REALTIME_ENABLED:
+        return
+    if skip_sid is None and has_request_context():
+        skip_sid = request.headers.get("X-Socket-Id")
+    try:
+        socketio.emit(event, data, to=user_room(user_id), skip_sid=skip_sid)
+    except Exception as e:
+        # Tabs catch up on their next fetch; a lost push must not fail the request
+        logger.warning(f"Could not publish {event}: {e}")
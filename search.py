@@ -0,0 +1,165 @@
+import re
+from sqlalchemy import text
+from cold_storage import decompress
+
+MAX_TERMS = 8
+SNIPPET_LENGTH = 160
+REINDEX_BATCH_SIZE = 500
+
+# Postgres keeps a tsvector column per table, so every write (including the
+# write-behind log's bulk inserts) updates the GIN index. project_idea's is
+# generated; chat_message's is set by a trigger that leaves it alone when
+# compaction empties content, so cold messages stay searchable.
+POSTGRES_SCHEMA = [
+    "ALTER TABLE project_idea ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', coalesce(topic, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(content, '')), 'B')) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_project_idea_search ON project_idea USING gin (search_vector)",
+    "ALTER TABLE chat_message ADD COLUMN IF NOT EXISTS search_vector tsvector",
+    "CREATE OR REPLACE FUNCTION chat_message_search_vector() RETURNS trigger AS $$ BEGIN "
+    "IF NEW.content_z IS NULL THEN NEW.search_vector := to_tsvector('english', coalesce(NEW.content, '')); END IF; "
+    "RETURN NEW; END $$ LANGUAGE plpgsql",
+    "DROP TRIGGER IF EXISTS chat_message_search_vector ON chat_message",
+    "CREATE TRIGGER chat_message_search_vector BEFORE INSERT OR UPDATE OF content ON chat_message "
+    "FOR EACH ROW EXECUTE FUNCTION chat_message_search_vector()",
+    "CREATE INDEX IF NOT EXISTS ix_chat_message_search ON chat_message USING gin (search_vector)",
+]
+
+# SQLite uses FTS5 tables kept in step by triggers. chat_message_fts keeps its
+# own copy of the text rather than reading chat_message, because compacted
+# rows no longer hold it there.
+SQLITE_SCHEMA = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS project_idea_fts USING fts5("
+    "topic, content, content='project_idea', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS project_idea_fts_ai AFTER INSERT ON project_idea BEGIN "
+    "INSERT INTO project_idea_fts(rowid, topic, content) VALUES (new.id, new.topic, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS project_idea_fts_ad AFTER DELETE ON project_idea BEGIN "
+    "INSERT INTO project_idea_fts(project_idea_fts, rowid, topic, content) VALUES ('delete', old.id, old.topic, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS project_idea_fts_au AFTER UPDATE OF topic, content ON project_idea BEGIN "
+    "INSERT INTO project_idea_fts(project_idea_fts, rowid, topic, content) VALUES ('delete', old.id, old.topic, old.content); "
+    "INSERT INTO project_idea_fts(rowid, topic, content) VALUES (new.id, new.topic, new.content); END",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS chat_message_fts USING fts5(content, tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS chat_message_fts_ai AFTER INSERT ON chat_message BEGIN "
+    "INSERT INTO chat_message_fts(rowid, content) VALUES (new.id, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS chat_message_fts_ad AFTER DELETE ON chat_message BEGIN "
+    "DELETE FROM chat_message_fts WHERE rowid = old.id; END",
+    "CREATE TRIGGER IF NOT EXISTS chat_message_fts_au AFTER UPDATE OF content ON chat_message WHEN new.content_z IS NULL BEGIN "
+    "DELETE FROM chat_message_fts WHERE rowid = old.id; "
+    "INSERT INTO chat_message_fts(rowid, content) VALUES (new.id, new.content); END",
+]
+
+SQLITE_REBUILD = [
+    "INSERT INTO project_idea_fts(project_idea_fts) VALUES ('rebuild')",
+    "DELETE FROM chat_message_fts",
+    "INSERT INTO chat_message_fts(rowid, content) SELECT id, content FROM chat_message WHERE content_z IS NULL",
+]
+
+POSTGRES_REBUILD = [
+    "UPDATE chat_message SET search_vector = to_tsvector('english', coalesce(content, '')) WHERE content_z IS NULL",
+]
+
+# Both queries return one ranked page of (kind, id, project_id, rank); higher rank is better
+POSTGRES_SEARCH = text("""
+    SELECT kind, id, project_id, rank FROM (
+        SELECT 'project' AS kind, p.id AS id, p.id AS project_id,
+               ts_rank(p.search_vector, query) AS rank, p.timestamp AS timestamp
+        FROM project_idea p, websearch_to_tsquery('english', :q) AS query
+        WHERE p.search_vector @@ query AND p.user_id = :user_id AND p.public_id IS NOT NULL
+        UNION ALL
+        SELECT 'message', m.id, m.project_id, ts_rank(m.search_vector, query), m.timestamp
+        FROM chat_message m
+        JOIN project_idea p ON p.id = m.project_id, websearch_to_tsquery('english', :q) AS query
+        WHERE m.search_vector @@ query AND m.user_id = :user_id AND p.public_id IS NOT NULL
+    ) AS hits
+    ORDER BY hits.rank DESC, hits.timestamp DESC, hits.id DESC
+    LIMIT :limit OFFSET :offset
+""")
+
+SQLITE_SEARCH = text("""
+    SELECT kind, id, project_id, rank FROM (
+        SELECT 'project' AS kind, p.id AS id, p.id AS project_id,
+               -bm25(project_idea_fts, 2.0, 1.0) AS rank, p.timestamp AS timestamp
+        FROM project_idea_fts JOIN project_idea p ON p.id = project_idea_fts.rowid
+        WHERE project_idea_fts MATCH :q AND p.user_id = :user_id AND p.public_id IS NOT NULL
+        UNION ALL
+        SELECT 'message', m.id, m.project_id, -bm25(chat_message_fts), m.timestamp
+        FROM chat_message_fts
+        JOIN chat_message m ON m.id = chat_message_fts.rowid
+        JOIN project_idea p ON p.id = m.project_id
+        WHERE chat_message_fts MATCH :q AND m.user_id = :user_id AND p.public_id IS NOT NULL
+    ) AS hits
+    ORDER BY hits.rank DESC, hits.timestamp DESC, hits.id DESC
+    LIMIT :limit OFFSET :offset
+""")
+
+
+def query_terms(q):
+    '''Words of a search box string, lower-cased and capped at MAX_TERMS'''
+    return re.findall(r"\w+", q.lower())[:MAX_TERMS]
+
+
+def fts5_query(terms):
+    '''Quote each term so FTS5 operators in user input are never interpreted.
+
+    Terms are ANDed and the last one matches as a prefix, for search-as-you-type.
+    '''
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+def ensure_index(conn):
+    '''Create the full-text columns, tables and triggers if they are missing.
+
+    The migration does this too; the CLI calls it for databases made with
+    create_all(), and on SQLite after a batch migration has recreated
+    project_idea or chat_message, which drops their triggers.
+    '''
+    statements = POSTGRES_SCHEMA if conn.dialect.name == "postgresql" else SQLITE_SCHEMA
+    for statement in statements:
+        conn.execute(text(statement))
+
+
+def rebuild_index(conn):
+    '''Re-index every existing row, decompressing compacted messages in batches'''
+    if conn.dialect.name == "postgresql":
+        statements = POSTGRES_REBUILD
+        reindex = text("UPDATE chat_message SET search_vector = to_tsvector('english', :content) WHERE id = :id")
+    else:
+        statements = SQLITE_REBUILD
+        reindex = text("INSERT INTO chat_message_fts(rowid, content) VALUES (:id, :content)")
+    for statement in statements:
+        conn.execute(text(statement))
+
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            text("SELECT id, content_z FROM chat_message WHERE content_z IS NOT NULL AND id > :last_id ORDER BY id LIMIT :limit"),
+            {"last_id": last_id, "limit": REINDEX_BATCH_SIZE}
+        ).fetchall()
+        if not rows:
+            break
+        conn.execute(reindex, [{"id": row.id, "content": decompress(row.content_z)} for row in rows])
+        last_id = rows[-1].id
+
+
+def search(conn, user_id, q, limit, offset=0):
+    '''One page of ranked hits for a user's search, or [] if q has no words'''
+    terms = query_terms(q)
+    if not terms:
+        return []
+    if conn.dialect.name == "postgresql":
+        # websearch_to_tsquery() parses raw input safely and keeps "phrases" and -exclusions
+        statement = POSTGRES_SEARCH
+    else:
+        statement, q = SQLITE_SEARCH, fts5_query(terms)
+    return conn.execute(statement, {"q": q, "user_id": user_id, "limit": limit, "offset": offset}).fetchall()
+
+
+def snippet(content, terms, length=SNIPPET_LENGTH):
+    '''A window of content around the first matching term, or its start'''
+    lowered = content.lower()
+    positions = [p for p in (lowered.find(term[:5]) for term in terms) if p >= 0]
+    start = max(min(positions) - length // 4, 0) if positions else 0
+    window = content[start:start + length].strip()
+    return ("..." if start > 0 else "") + window + ("..." if start + length < len(content) else "")
@@ -1,5 +1,23 @@
 let selectedProjectId = null;
 let projectToDelete = null;
+// The chat shows a window of at most CHAT_WINDOW_SIZE messages; the rest are fetched as the reader scrolls
+const CHAT_WINDOW_SIZE = 150;
+let oldestMessageId = null;
+let newestMessageId = null;
+let hasOlderMessages = false;
+let hasNewerMessages = false;
+let loadingOlderMessages = false;
+let loadingNewerMessages = false;
+let projectsCursor = null;
+let loadingMoreProjects = false;
+// ETag of the response each list was last rendered from
+const renderedEtags = {};
+let searchQuery = "";
+let searchOffset = null;
+let searchTimer = null;
+// Socket.IO connection that pushes changes made in other tabs
+let socket = null;
+let socketConnectedBefore = false;
 
 const msgInput = $("messageInput");
 if (msgInput) {
@@ -41,6 +59,13 @@ function showToast(message, category = "danger") {
     setTimeout(() => wrapper.remove(), 4000);
 }
 
+// The server skips the socket named here when it pushes the change back out
+function jsonHeaders(extra = {}) {
+    const headers = { "Content-Type": "application/json", ...extra };
+    if (socket?.connected) headers["X-Socket-Id"] = socket.id;
+    return headers;
+}
+
 function safeFetch(url, opts) {
     return fetch(url, opts).then(async (res) => {
         if (!res.ok) {
@@ -54,36 +79,42 @@ function safeFetch(url, opts) {
     });
 }
 
+// Reads go out with the browser's If-None-Match. On a 304 the cached body comes
+// back with the same ETag, and resolves to null if that is what's on screen.
+function fetchIfChanged(url, elementId) {
+    return fetch(url).then(async (res) => {
+        if (!res.ok) {
+            let detail = "";
+            try { detail = (await res.json()).error; } catch {}
+            throw new Error(detail || `HTTP ${res.status}`);
+        }
+        const etag = res.headers.get("ETag");
+        if (etag && renderedEtags[elementId] === etag) return null;
+        return { etag, data: await res.json() };
+    });
+}
+
 function fetchProjects() {
     if (!$("projectList")) return;
 
-    safeFetch("/history")
-    .then((data) => {
+    fetchIfChanged("/history", "projectList")
+    .then((result) => {
+        if (!result) return;
+        const { etag, data } = result;
+        renderedEtags.projectList = etag;
         const list = $("projectList");
+        const projects = data?.projects || [];
         list.innerHTML = "";
-        if (!Array.isArray(data) || data.length === 0) {
+        projectsCursor = data?.next_cursor || null;
+        if (projects.length === 0) {
             if ($("emptyProjects")) $("emptyProjects").style.display = "block";
             return;
         }
         if ($("emptyProjects")) $("emptyProjects").style.display = "none";
-        data.forEach((project) => {
-            const li = document.createElement("li");
-            li.className = "history-item d-flex justify-content-between align-items-center";
-            li.innerHTML = `
-                <span class="flex-grow-1">${project.topic}</span>
-                <button class="btn btn-sm btn-outline-light me-1 rename-btn" data-id="${project.public_id}">
-                    <i class="fas fa-edit"></i>
-                </button>
-                <button class="btn btn-sm btn-outline-danger delete-btn" data-id="${project.public_id}">
-                    <i class="fas fa-trash"></i>
-                </button>
-            `;
-            li.querySelector("span").onclick = () => selectProject(project.public_id);
-            list.appendChild(li);
-        });
+        projects.forEach((project) => list.appendChild(buildProjectItem(project)));
 
-        if (!selectedProjectId && data[0]?.public_id) {
-            selectProject(data[0].public_id);
+        if (!selectedProjectId && projects[0]?.public_id) {
+            selectProject(projects[0].public_id);
         }
     })
     .catch((err) => {
@@ -91,6 +122,144 @@ function fetchProjects() {
     });
 }
 
+function fetchMoreProjects() {
+    if (!projectsCursor || loadingMoreProjects) return;
+    loadingMoreProjects = true;
+
+    safeFetch(`/history?cursor=${encodeURIComponent(projectsCursor)}`)
+    .then((data) => {
+        const list = $("projectList");
+        delete renderedEtags.projectList;
+        (data?.projects || []).forEach((project) => list.appendChild(buildProjectItem(project)));
+        projectsCursor = data?.next_cursor || null;
+    })
+    .catch((err) => showToast(`Failed to load projects: ${err.message}`, "warning"))
+    .finally(() => { loadingMoreProjects = false; });
+}
+
+function buildProjectItem(project) {
+    const li = document.createElement("li");
+    li.className = "history-item d-flex justify-content-between align-items-center";
+    li.innerHTML = `
+        <span class="flex-grow-1">${project.topic}</span>
+        <button class="btn btn-sm btn-outline-light me-1 rename-btn" data-id="${project.public_id}">
+            <i class="fas fa-edit"></i>
+        </button>
+        <button class="btn btn-sm btn-outline-danger delete-btn" data-id="${project.public_id}">
+            <i class="fas fa-trash"></i>
+        </button>
+    `;
+    li.querySelector("span").onclick = () => selectProject(project.public_id);
+    return li;
+}
+
+function upsertProjectItem(project) {
+    const list = $("projectList");
+    if (!list || !project?.public_id) return;
+    delete renderedEtags.projectList;
+    const existing = list.querySelector(`.rename-btn[data-id="${project.public_id}"]`);
+    if (existing) {
+        existing.parentElement.querySelector("span").textContent = project.topic;
+        return;
+    }
+    // New projects sort first, as in /history
+    list.prepend(buildProjectItem(project));
+    if ($("emptyProjects")) $("emptyProjects").style.display = "none";
+}
+
+function removeProjectItem(publicId) {
+    const item = document.querySelector(`#projectList .rename-btn[data-id="${publicId}"]`);
+    if (item) item.closest(".history-item").remove();
+    delete renderedEtags.projectList;
+    if (selectedProjectId !== publicId) return;
+    selectedProjectId = null;
+    const chatDiv = $("chatHistory");
+    if (chatDiv) {
+        chatDiv.innerHTML = `<p class="text-gray-500">Select a project to start chatting.</p>`;
+        delete chatDiv.dataset.projectId;
+        delete renderedEtags.chatHistory;
+    }
+}
+
+function connectRealtime() {
+    if (typeof io === "undefined" || !$("projectList")) return;
+    // WebSocket only: long-polling would need sticky sessions across gunicorn workers
+    socket = io({ transports: ["websocket"] });
+    socket.on("connect", () => {
+        // Anything pushed while disconnected was missed; conditional GETs catch up cheaply
+        if (socketConnectedBefore) {
+            fetchProjects();
+            fetchChathistory();
+        }
+        socketConnectedBefore = true;
+    });
+    socket.on("project_created", upsertProjectItem);
+    socket.on("project_updated", upsertProjectItem);
+    socket.on("project_deleted", (project) => removeProjectItem(project.public_id));
+    socket.on("message_created", ({ project_id, message }) => {
+        // With the window scrolled back, the message is fetched when the reader scrolls down to it
+        if (project_id !== selectedProjectId || hasNewerMessages) return;
+        if (message.id && document.querySelector(`#chatHistory .message[data-id="${message.id}"]`)) return;
+        if (adoptFlushedMessage(message)) return;
+        const el = appendMessage(message, isNearBottom($("chatHistory")));
+        if (el) highlightCode(el);
+    });
+}
+
+on("sidebar", "scroll", (e) => {
+    const el = e.target;
+    if (el.scrollTop + el.clientHeight >= el.scrollHeight - 50) {
+        if (searchQuery) fetchSearchResults(true);
+        else fetchMoreProjects();
+    }
+});
+
+on("projectSearch", "input", (e) => {
+    clearTimeout(searchTimer);
+    searchTimer = setTimeout(() => {
+        searchQuery = e.target.value.trim();
+        const searching = Boolean(searchQuery);
+        $("searchResults").style.display = searching ? "block" : "none";
+        $("projectList").style.display = searching ? "none" : "block";
+        if (searching) fetchSearchResults(false);
+    }, 250);
+});
+
+function fetchSearchResults(more) {
+    if (more && (searchOffset === null || loadingMoreProjects)) return;
+    const query = searchQuery;
+    const offset = more ? searchOffset : 0;
+    loadingMoreProjects = true;
+
+    safeFetch(`/search?q=${encodeURIComponent(query)}&offset=${offset}`)
+    .then((data) => {
+        // A newer query has been typed since this request went out
+        if (query !== searchQuery) return;
+        const list = $("searchResults");
+        if (!more) list.innerHTML = "";
+        (data?.results || []).forEach((result) => list.appendChild(buildSearchResult(result)));
+        if (!more && list.children.length === 0) {
+            list.innerHTML = `<li class="empty-history">No matches.</li>`;
+        }
+        searchOffset = data?.next_offset ?? null;
+    })
+    .catch((err) => showToast(`Search failed: ${err.message}`, "warning"))
+    .finally(() => { loadingMoreProjects = false; });
+}
+
+function buildSearchResult(result) {
+    const li = document.createElement("li");
+    li.className = "history-item search-result";
+    const title = document.createElement("strong");
+    title.textContent = result.topic;
+    const snippet = document.createElement("small");
+    snippet.className = "d-block";
+    snippet.textContent = result.snippet;
+    li.append(title, snippet);
+    li.onclick = () => selectProject(result.project_id);
+    return li;
+}
+
 function selectProject(publicId) {
     selectedProjectId = publicId;
     fetchChathistory();
@@ -100,27 +269,63 @@ function selectProject(publicId) {
 
 function sendMessage(message) {
     if (!selectedProjectId || !message) return;
+    // The reply goes at the end of the conversation, so bring the window back there first
+    if (hasNewerMessages) {
+        if ($("messageInput")) $("messageInput").value = "";
+        showLatestMessages().then(() => sendMessage(message));
+        return;
+    }
 
     const btn = $("sendBtn");
     const spinner = $("loadingSpinner");
     if (btn) btn.disabled = true;
     if (spinner) spinner.style.display = "inline-block";
+    if ($("messageInput")) $("messageInput").value = "";
 
-    safeFetch("/chat", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ message, project_id: selectedProjectId }),
-    })
-    .then((data) => {
-        renderChatHistory(data.history);
-        if ($("messageInput")) $("messageInput").value = "";
+    const userEl = appendMessage({ role: "user", content: message });
+    const replyEl = appendMessage({ role: "assistant", content: "" });
+    let reply = "";
+    let renderQueued = false;
+    let finished = false;
 
-        if (data.project_title && data.project_id) {
-            const item = document.querySelector(`.history-item .rename-btn[data-id="${data.project_id}"]`);
-            if (item) {
-                item.parentElement.querySelector("span").textContent = data.project_title;
+    const payload = { message, project_id: selectedProjectId };
+    const send = $("chatForm")?.dataset.mode === "jobs" ? queueChat : streamChat;
+    send(payload, (event) => {
+        if (event.token) {
+            reply += event.token;
+            // Re-parse the growing reply at most once per frame, not once per token
+            if (!renderQueued) {
+                renderQueued = true;
+                requestAnimationFrame(() => {
+                    renderQueued = false;
+                    if (finished) return;
+                    renderMessageContent(replyEl, "assistant", reply);
+                    scrollChatToBottom();
+                });
+            }
+        }
+        if (event.done) {
+            finished = true;
+            renderMessageContent(replyEl, "assistant", reply);
+            [[userEl, event.user_message], [replyEl, event.message]].forEach(([el, msg]) => {
+                if (!el || !msg) return;
+                const bubble = el.closest(".message");
+                // Write-behind messages have no id until flushed; the log_id ties them to their row
+                if (msg.id != null) bubble.dataset.id = msg.id;
+                if (msg.log_id) bubble.dataset.logId = msg.log_id;
+                bubble.querySelector(".timestamp").textContent = msg.timestamp;
+                if (msg.html) el.innerHTML = msg.html;
+            });
+            syncWindowBounds();
+            highlightCode(replyEl);
+            if (event.project_title && event.project_id) {
+                const item = document.querySelector(`.history-item .rename-btn[data-id="${event.project_id}"]`);
+                if (item) {
+                    item.parentElement.querySelector("span").textContent = event.project_title;
+                }
             }
         }
+        if (event.error) showToast(`Failed to send: ${event.error}`);
     })
     .catch((err) => showToast(`Failed to send: ${err.message}`))
     .finally(() => {
@@ -129,62 +334,295 @@ function sendMessage(message) {
     });
 }
 
+async function queueChat(payload, onEvent) {
+    const job = await safeFetch("/chat", {
+        method: "POST",
+        headers: jsonHeaders(),
+        body: JSON.stringify({ ...payload, async: true }),
+    });
+
+    // The reply is written server-side even if this page goes away, so polling can always resume
+    while (true) {
+        await new Promise((resolve) => setTimeout(resolve, 1000));
+        const status = await safeFetch(`/jobs/${job.job_id}`);
+        if (status.status === "done") {
+            onEvent({ token: status.result.reply });
+            onEvent({ done: true, user_message: job.message, ...status.result });
+            return;
+        }
+        if (status.status === "failed") throw new Error(status.error || "Generation failed");
+    }
+}
+
+async function streamChat(payload, onEvent) {
+    const res = await fetch("/chat/stream", {
+        method: "POST",
+        headers: jsonHeaders({ "Accept": "text/event-stream" }),
+        body: JSON.stringify(payload),
+    });
+    if (!res.ok || !res.body) {
+        let detail = "";
+        try { detail = (await res.json()).error; } catch {}
+        throw new Error(detail || `HTTP ${res.status}`);
+    }
+
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let boundary;
+        while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+            const frame = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            const data = frame.split("\n")
+                .filter((line) => line.startsWith("data:"))
+                .map((line) => line.slice(5).trim())
+                .join("");
+            if (data) onEvent(JSON.parse(data));
+        }
+    }
+}
+
 function fetchChathistory() {
     if (!selectedProjectId) return;
-    safeFetch("/chat", {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({ message: "", project_id: selectedProjectId }),
+    const projectId = selectedProjectId;
+    // The same conversation is already on screen: only fetch what came after it
+    if ($("chatHistory")?.dataset.projectId === projectId && newestMessageId !== null && !hasNewerMessages) {
+        fetchNewerMessages();
+        return;
+    }
+    fetchIfChanged(`/projects/${projectId}/messages`, "chatHistory")
+    .then((result) => {
+        if (!result || projectId !== selectedProjectId) return;
+        const { etag, data } = result;
+        renderChatHistory(data.messages || []);
+        renderedEtags.chatHistory = etag;
+        hasOlderMessages = !!data.has_more;
     })
+    .catch((err) => showToast(`Failed to load chat: ${err.message}`));
+}
+
+function showLatestMessages() {
+    const projectId = selectedProjectId;
+    return safeFetch(`/projects/${projectId}/messages`)
     .then((data) => {
-        if (data?.history) renderChatHistory(data.history);
+        if (projectId !== selectedProjectId) return;
+        renderChatHistory(data.messages || []);
+        hasOlderMessages = !!data.has_more;
     })
     .catch((err) => showToast(`Failed to load chat: ${err.message}`));
 }
 
+// The page may arrive with the newest turns of the latest project already rendered
+function adoptRenderedChat() {
+    const chatDiv = $("chatHistory");
+    if (!chatDiv?.dataset.projectId) return;
+    selectedProjectId = chatDiv.dataset.projectId;
+    hasOlderMessages = chatDiv.dataset.hasMore === "true";
+    syncWindowBounds();
+    highlightCode(chatDiv);
+    scrollChatToBottom();
+}
+
+function fetchOlderMessages() {
+    if (!selectedProjectId || !hasOlderMessages || loadingOlderMessages || oldestMessageId === null) return;
+    const chatDiv = $("chatHistory");
+    const projectId = selectedProjectId;
+    loadingOlderMessages = true;
+
+    safeFetch(`/projects/${projectId}/messages?before=${oldestMessageId}`)
+    .then((data) => {
+        if (projectId !== selectedProjectId) return;
+        hasOlderMessages = !!data.has_more;
+        if (!data.messages?.length) return;
+        delete renderedEtags.chatHistory;
+        const previousHeight = chatDiv.scrollHeight;
+        const fragment = document.createDocumentFragment();
+        data.messages.forEach((msg) => fragment.appendChild(buildMessage(msg)));
+        chatDiv.insertBefore(fragment, chatDiv.firstChild);
+        // Keep the reader's place instead of jumping to the prepended messages
+        chatDiv.scrollTop += chatDiv.scrollHeight - previousHeight;
+        trimWindow("bottom");
+        syncWindowBounds();
+        highlightCode(chatDiv);
+    })
+    .catch((err) => showToast(`Failed to load older messages: ${err.message}`))
+    .finally(() => { loadingOlderMessages = false; });
+}
+
+function fetchNewerMessages() {
+    if (!selectedProjectId || loadingNewerMessages || newestMessageId === null) return;
+    const chatDiv = $("chatHistory");
+    const projectId = selectedProjectId;
+    loadingNewerMessages = true;
+
+    safeFetch(`/projects/${projectId}/messages?after=${newestMessageId}`)
+    .then((data) => {
+        if (projectId !== selectedProjectId) return;
+        hasNewerMessages = !!data.has_more;
+        const follow = !hasNewerMessages && isNearBottom(chatDiv);
+        const fragment = document.createDocumentFragment();
+        (data.messages || []).forEach((msg) => {
+            // Unflushed write-behind messages have no id yet; they arrive with one on a later fetch
+            if (msg.id == null || chatDiv.querySelector(`.message[data-id="${msg.id}"]`)) return;
+            if (adoptFlushedMessage(msg)) return;
+            fragment.appendChild(buildMessage(msg));
+        });
+        if (!fragment.childNodes.length) {
+            syncWindowBounds();
+            return;
+        }
+        clearChatPlaceholder(chatDiv);
+        chatDiv.appendChild(fragment);
+        delete renderedEtags.chatHistory;
+        trimWindow("top");
+        syncWindowBounds();
+        highlightCode(chatDiv);
+        if (follow) scrollChatToBottom();
+    })
+    .catch((err) => showToast(`Failed to load new messages: ${err.message}`))
+    .finally(() => { loadingNewerMessages = false; });
+}
+
+on("chatHistory", "scroll", (e) => {
+    const el = e.target;
+    if (el.scrollTop < 50) fetchOlderMessages();
+    else if (hasNewerMessages && isNearBottom(el)) fetchNewerMessages();
+});
+
+function isNearBottom(el) {
+    return !!el && el.scrollTop + el.clientHeight >= el.scrollHeight - 50;
+}
+
+// Drop bubbles beyond CHAT_WINDOW_SIZE from the far edge; they are fetched again when scrolled back to
+function trimWindow(edge) {
+    const chatDiv = $("chatHistory");
+    let excess = chatDiv.querySelectorAll(".message").length - CHAT_WINDOW_SIZE;
+    if (excess <= 0) return;
+    if (edge === "top") {
+        const previousHeight = chatDiv.scrollHeight;
+        while (excess-- > 0 && chatDiv.firstElementChild?.dataset.id) chatDiv.firstElementChild.remove();
+        chatDiv.scrollTop -= previousHeight - chatDiv.scrollHeight;
+        hasOlderMessages = true;
+    } else {
+        // Bubbles without an id are still being written and must stay
+        while (excess-- > 0 && chatDiv.lastElementChild?.dataset.id) chatDiv.lastElementChild.remove();
+        hasNewerMessages = true;
+    }
+}
+
+// A bubble shown before its write-behind row was flushed is replaced in place by that row
+function adoptFlushedMessage(msg) {
+    if (!msg.log_id) return false;
+    const pending = document.querySelector(`#chatHistory .message[data-log-id="${msg.log_id}"]`);
+    if (!pending) return false;
+    if (msg.id != null && !pending.dataset.id) {
+        const bubble = buildMessage(msg);
+        pending.replaceWith(bubble);
+        highlightCode(bubble);
+    }
+    return true;
+}
+
+function syncWindowBounds() {
+    const ids = [...$("chatHistory").querySelectorAll(".message[data-id]")]
+        .map((el) => Number(el.dataset.id))
+        .filter(Number.isFinite);
+    oldestMessageId = ids.length ? ids[0] : null;
+    newestMessageId = ids.length ? ids[ids.length - 1] : null;
+}
+
+function clearChatPlaceholder(chatDiv) {
+    chatDiv.querySelectorAll(":scope > :not(.message)").forEach((el) => el.remove());
+}
+
 function renderChatHistory(history) {
     const chatDiv = $("chatHistory");
     if (!chatDiv) return;
-    chatDiv.innerHTML = "";
-    history.forEach((msg) => {
-        const bubble = document.createElement("div");
-        const userClass = msg.role === "user" ? "user-message" : "ai-message";
-        bubble.className = "message mb-2 " + userClass;
-
-        let formattedContent = msg.content;
-        if (msg.role === "assistant") {
-            try {
-                formattedContent = marked.parse(msg.content);
-                setTimeout(() => {
-                    document.querySelectorAll("pre code").forEach((block) => {
-                        hljs.highlightElement(block);
-                    });
-                }, 0);
-            } catch {
-                formattedContent = msg.content;
-            }
+    const fragment = document.createDocumentFragment();
+    history.forEach((msg) => fragment.appendChild(buildMessage(msg)));
+    chatDiv.replaceChildren(fragment);
+    chatDiv.dataset.projectId = selectedProjectId;
+    delete renderedEtags.chatHistory;
+    hasNewerMessages = false;
+    syncWindowBounds();
+    highlightCode(chatDiv);
+    scrollChatToBottom();
+}
+
+function appendMessage(msg, follow = true) {
+    const chatDiv = $("chatHistory");
+    if (!chatDiv) return null;
+
+    clearChatPlaceholder(chatDiv);
+    const bubble = buildMessage(msg);
+    chatDiv.appendChild(bubble);
+    delete renderedEtags.chatHistory;
+    trimWindow("top");
+    syncWindowBounds();
+    if (follow) scrollChatToBottom();
+    return bubble.querySelector(".message-content");
+}
+
+function buildMessage(msg) {
+    const bubble = document.createElement("div");
+    if (msg.id) bubble.dataset.id = msg.id;
+    if (msg.log_id) bubble.dataset.logId = msg.log_id;
+    const userClass = msg.role === "user" ? "user-message" : "ai-message";
+    bubble.className = "message mb-2 " + userClass;
+    bubble.innerHTML = `
+        <div class="message-header">
+            <span>${msg.role === "user" ? "You" : "AI Mentor"}</span>
+            <span class="timestamp">${msg.timestamp || ""}</span>
+        </div>
+        <div class="message-content"></div>
+    `;
+    const contentEl = bubble.querySelector(".message-content");
+    if (msg.html) {
+        contentEl.innerHTML = msg.html;
+    } else {
+        renderMessageContent(contentEl, msg.role, msg.content);
+    }
+    return bubble;
+}
+
+function renderMessageContent(el, role, content) {
+    let formattedContent = content;
+    if (role === "assistant") {
+        try {
+            formattedContent = marked.parse(content);
+        } catch {
+            formattedContent = content;
         }
+    }
+    el.innerHTML = formattedContent;
+}
 
-        bubble.innerHTML = `
-            <div class="message-header">
-                <span>${msg.role === "user" ? "You" : "AI Mentor"}</span>
-                <span class="timestamp">${msg.timestamp || ""}</span>
-            </div>
-            <div class="message-content">${formattedContent}</div>
-        `;
-        chatDiv.appendChild(bubble);
-    });
-    chatDiv.scrollTop = chatDiv.scrollHeight;
+function highlightCode(root) {
+    setTimeout(() => {
+        // Blocks already highlighted keep their markup, so re-scanning the window is cheap
+        root.querySelectorAll("pre code:not([data-highlighted])").forEach((block) => {
+            hljs.highlightElement(block);
+        });
+    }, 0);
+}
+
+function scrollChatToBottom() {
+    const chatDiv = $("chatHistory");
+    if (chatDiv) chatDiv.scrollTop = chatDiv.scrollHeight;
 }
 
 on("newProjectBtn", "click", () => {
     safeFetch("/create_project", {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
+        headers: jsonHeaders(),
         body: JSON.stringify({ topic: "Untitled Project", content: "" }),
     })
     .then((data) => {
-        fetchProjects();
+        upsertProjectItem(data);
         if (data?.public_id) {
             selectProject(data.public_id);
         }
@@ -207,12 +645,12 @@ on("newProjectForm", "submit", (e) => {
     if (!title) return showToast("Please provide a project title", "warning");
     safeFetch("/create_project", {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
+        headers: jsonHeaders(),
         body: JSON.stringify({ topic: title, content: desc }),
     })
     .then((data) => {
         if ($("newProjectModal")) $("newProjectModal").style.display = "none";
-        fetchProjects();
+        upsertProjectItem(data);
         if (data?.public_id) selectProject(data.public_id);
     })
     .catch((err) => showToast(`Failed to create project: ${err.message}`));
@@ -230,12 +668,12 @@ on("renameProjectForm", "submit", (e) => {
     if (!title || !selectedProjectId) return;
     safeFetch("/rename_project", {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
+        headers: jsonHeaders(),
         body: JSON.stringify({ project_id: selectedProjectId, topic: title }),
     })
-    .then(() => {
+    .then((data) => {
         $("renameProjectModal").style.display = "none";
-        fetchProjects();
+        upsertProjectItem(data);
     })
     .catch((err) => showToast(`Failed to rename: ${err.message}`));
 });
@@ -261,19 +699,10 @@ on("confirmDeleteBtn", "click", () => {
 
     safeFetch("/delete_project", {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
+        headers: jsonHeaders(),
         body: JSON.stringify({ project_id: projectToDelete }),
     })
-    .then(() => {
-        fetchProjects();
-        const chatDiv = $("chatHistory");
-        if (chatDiv) {
-            chatDiv.innerHTML = `<p class="text-gray-500">Select a project to start chatting.</p>`;
-        }
-        if (selectedProjectId === projectToDelete) {
-            selectedProjectId = null;
-        }
-    })
+    .then(() => removeProjectItem(projectToDelete))
     .catch((err) => showToast(`Failed to delete: ${err.message}`))
     .finally(() => {
         $("deleteProjectModal").style.display = "none";
@@ -282,5 +711,7 @@ on("confirmDeleteBtn", "click", () => {
 })
 
 window.addEventListener("load", () => {
+    adoptRenderedChat();
     if ($("projectList")) fetchProjects();
+    connectRealtime();
 })
\ No newline at end of file
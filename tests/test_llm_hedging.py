@@ -0,0 +1,140 @@
+"""Hedging and winner selection in LLMClient.stream_completion(), against in-process stub providers.
+
+    python -m pytest tests/test_llm_hedging.py
+"""
+import os
+import sys
+import time
+import threading
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm import LLMClient, Provider
+
+
+class StubStream:
+    '''Yields tokens after first_token_delay; with stall=True it never yields and only ends when closed'''
+
+    def __init__(self, tokens, first_token_delay=0.0, stall=False):
+        self.tokens = tokens
+        self.first_token_delay = first_token_delay
+        self.stall = stall
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        if self.stall:
+            self.closed.wait(5)
+            raise ConnectionError("stream closed")
+        if self.closed.wait(self.first_token_delay):
+            raise ConnectionError("stream closed")
+        for token in self.tokens:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))], x_groq=None)
+
+    def close(self):
+        self.closed.set()
+
+
+class StubProvider(Provider):
+    def __init__(self, name, tokens=("ok",), first_token_delay=0.0, stall=False, error=None):
+        super().__init__(name, "stub-model")
+        self.calls = 0
+        self.streams = []
+
+        def create(**params):
+            self.calls += 1
+            if error is not None:
+                raise error
+            stream = StubStream(list(tokens), first_token_delay, stall)
+            self.streams.append(stream)
+            return stream
+
+        self._client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+
+def make_client(providers, max_inflight=8):
+    client = LLMClient(max_inflight=max_inflight, max_queue=4, queue_timeout=1, call_timeout=5)
+    client.hedging = True
+    client.hedge_default_delay = 0.05
+    client.hedge_min_delay = 0.05
+    client.providers = providers
+    return client
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_fast_primary_wins_without_hedging():
+    primary, secondary = StubProvider("primary", ["a", "b"]), StubProvider("secondary", ["x"])
+    client = make_client([primary, secondary])
+
+    assert list(client.stream_completion([])) == ["a", "b"]
+    assert secondary.calls == 0
+    assert wait_until(lambda: client.inflight == 0)
+
+
+def test_stalled_primary_is_hedged_and_closed():
+    primary, secondary = StubProvider("primary", stall=True), StubProvider("secondary", ["x", "y"])
+    client = make_client([primary, secondary])
+
+    assert list(client.stream_completion([])) == ["x", "y"]
+    assert secondary.calls == 1
+    # The loser is closed when the winner is chosen, not when it next produces a chunk
+    assert primary.streams[0].closed.is_set()
+    assert wait_until(lambda: client.inflight == 0)
+
+
+def test_first_provider_to_produce_output_wins():
+    primary = StubProvider("primary", ["late"], first_token_delay=0.3)
+    secondary = StubProvider("secondary", ["early"], first_token_delay=0.05)
+    client = make_client([primary, secondary])
+
+    assert list(client.stream_completion([])) == ["early"]
+    assert primary.streams[0].closed.is_set()
+
+
+def test_failed_primary_fails_over():
+    primary, secondary = StubProvider("primary", error=ConnectionError("down")), StubProvider("secondary", ["x"])
+    client = make_client([primary, secondary])
+
+    assert list(client.stream_completion([])) == ["x"]
+    assert wait_until(lambda: client.inflight == 0)
+
+
+def test_hedge_waits_for_a_free_slot():
+    primary = StubProvider("primary", ["slow"], first_token_delay=0.3)
+    secondary = StubProvider("secondary", ["x"])
+    client = make_client([primary, secondary], max_inflight=1)
+
+    assert list(client.stream_completion([])) == ["slow"]
+    # With the only slot held by the primary, a hedge would have gone past LLM_MAX_INFLIGHT
+    assert secondary.calls == 0
+
+
+def test_concurrent_attempts_never_exceed_the_cap():
+    providers = [StubProvider(f"p{i}", [f"t{i}"], first_token_delay=0.2) for i in range(3)]
+    client = make_client(providers, max_inflight=2)
+    peak = []
+
+    def watch():
+        while not done.is_set():
+            peak.append(client.inflight)
+            time.sleep(0.005)
+
+    done = threading.Event()
+    watcher = threading.Thread(target=watch)
+    watcher.start()
+    try:
+        output = list(client.stream_completion([]))
+    finally:
+        done.set()
+        watcher.join()
+    assert output in (["t0"], ["t1"])
+    assert max(peak) <= 2
+    assert providers[2].calls == 0
@@ -0,0 +1,55 @@
+"""The hot chat and history queries must keep using their indexes (the check behind ``flask check-query-plans``).
+
+Runs on a throwaway SQLite database, and also on Postgres when DATABASE_URL
+points at one:
+
+    python -m pytest tests/test_query_plans.py
+    DATABASE_URL=postgresql://localhost/genproject_test python -m pytest tests/test_query_plans.py
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+POSTGRES_URL = os.getenv("DATABASE_URL", "") if os.getenv("DATABASE_URL", "").startswith("postgres") else None
+
+# create_app() insists on these but opens no connection, so placeholders are enough
+os.environ.setdefault("SECRET_KEY", "test")
+os.environ.setdefault("REDIS_URL", "redis://localhost:6379/0")
+
+import app as genproject
+
+DATABASES = [
+    "sqlite",
+    pytest.param("postgres", marks=pytest.mark.skipif(POSTGRES_URL is None, reason="DATABASE_URL is not a Postgres URL")),
+]
+
+
+@pytest.fixture(params=DATABASES)
+def flask_app(request, tmp_path, monkeypatch):
+    url = POSTGRES_URL if request.param == "postgres" else f"sqlite:///{tmp_path / 'plans.db'}"
+    monkeypatch.setenv("DATABASE_URL", url)
+    app = genproject.create_app()
+    with app.app_context():
+        genproject.db.create_all()
+        yield app
+        genproject.db.session.remove()
+        for engine in genproject.db.engines.values():
+            engine.dispose()
+
+
+@pytest.mark.parametrize("name", sorted(genproject.HOT_QUERIES))
+def test_hot_query_uses_its_index(flask_app, name):
+    index_name, build = genproject.HOT_QUERIES[name]
+    plan = genproject.explain_query(build())
+    assert genproject.plan_problems(plan, index_name) == [], "\n".join(plan)
+
+
+def test_plan_problems_flags_a_full_scan():
+    plan = ["SCAN chat_message"]
+    assert genproject.plan_problems(plan, "ix_chat_message_user_project_id") == [
+        "ix_chat_message_user_project_id is not used",
+        "full table scan: SCAN chat_message",
+    ]
@@ -1,11 +1,12 @@
 import os
 import time
 import logging
-from groq import Groq
 from dotenv import load_dotenv
 from flask import session, flash, redirect, url_for, jsonify
 from functools import wraps
-import bleach
+from llm import llm, LLMBusyError, cooperative_sleep
+from prompt_cache import prompt_cache
+from metrics import LLM_LATENCY, LLM_FIRST_TOKEN, LLM_RETRIES, LLM_ERRORS, record_llm_usage
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -14,70 +15,235 @@ logger = logging.getLogger(__name__)
 # Load environment variables
 load_dotenv()
 
-# Initialize Groq client
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+SYSTEM_PROMPT = {
+    "role": "system",
+    "content": (
+        "You are an experienced software developer and mentor. Provide creative, practical,"
+        "and detailed coding project ideas in response to user suggestions. "
+        "Respond with the following structure for new ideas:"
+        "Project Title, Description, Tech Stack, Key Features, Implementation Steps, Learning Challenges"
+        ", Target Audience, Difficulty and estimated time."
+        "For follow-up questions, give direct and useful advice"
+    )
+}
 
-def generate_project_idea(messages, max_retries=3):
+MODEL = llm.primary.model
+GENERATION_PARAMS = {"max_tokens": 1000, "temperature": 0.7, "top_p": 0.9}
+
+def is_first_turn(messages):
+    return len(messages) == 1 and messages[0]["role"] == "user"
+
+def with_system_prompt(messages):
+    '''Prepend the mentor system prompt to the first turn of a conversation'''
+    if is_first_turn(messages):
+        return [SYSTEM_PROMPT] + messages
+    return messages
+
+def is_cacheable_reply(reply):
+    return bool(reply) and not reply.startswith("Error:")
+
+def use_prompt_cache(messages, use_cache):
+    return use_cache and prompt_cache.enabled and is_first_turn(messages)
+
+def generate_project_idea(messages, max_retries=3, use_cache=True):
     '''Generate project idea using Groq API with error handling and retries'''
     if not os.getenv("GROQ_API_KEY"):
         logger.error("GROQ_API_KEY not found in environment variables")
         return "Error: GROQ_API_KEY not found in environment variables"
+
+    if use_prompt_cache(messages, use_cache):
+        return prompt_cache.get_or_compute(
+            with_system_prompt(messages),
+            {"model": MODEL, **GENERATION_PARAMS},
+            lambda: generate_project_idea(messages, max_retries, use_cache=False),
+            should_cache=is_cacheable_reply
+        )
     
-    if len(messages) == 1 and messages[0]["role"] == "user":
-        system_prompt = {
-            "role": "system",
-            "content": (
-                "You are an experienced software developer and mentor. Provide creative, practical,"
-                "and detailed coding project ideas in response to user suggestions. "
-                "Respond with the following structure for new ideas:"
-                "Project Title, Description, Tech Stack, Key Features, Implementation Steps, Learning Challenges"
-                ", Target Audience, Difficulty and estimated time."
-                "For follow-up questions, give direct and useful advice"
-            )
-        }
-        messages = [system_prompt] + messages
+    messages = with_system_prompt(messages)
 
     for attempt in range(max_retries):
+        if attempt:
+            LLM_RETRIES.inc(kind="generate")
+        call_started = None
         try:
-            response = client.chat.completions.create(
-                model="llama-3.1-8b-instant",
-                messages=messages,
-                max_tokens=1000,
-                temperature=0.7,
-                top_p=0.9,
-                stream=False
-            )
+            call_started = time.perf_counter()
+            # Streamed upstream so a slow provider can be hedged on time to first token; it takes its own slots
+            idea = "".join(llm.stream_completion(messages, kind="generate", **GENERATION_PARAMS)).strip()
+            LLM_LATENCY.observe(time.perf_counter() - call_started, kind="generate", outcome="ok")
 
-            if response and response.choices:
-                idea = response.choices[0].message.content.strip()
-                if idea:
-                    logger.info("Successfully generated project idea/response")
-                    return idea
-                else:
-                    logger.warning("Empty response from Groq API")
-                    return "Error: Empty response from AI"
+            if idea:
+                logger.info("Successfully generated project idea/response")
+                return idea
+            else:
+                logger.warning("Empty response from Groq API")
+                return "Error: Empty response from AI"
+        except LLMBusyError as e:
+            LLM_ERRORS.inc(kind="generate", error_class=type(e).__name__)
+            logger.warning(f"LLM client busy: {e}")
+            return "Error: The AI service is busy. Please try again in a moment."
         except Exception as e:
+            LLM_ERRORS.inc(kind="generate", error_class=type(e).__name__)
+            if call_started is not None:
+                LLM_LATENCY.observe(time.perf_counter() - call_started, kind="generate", outcome="error")
             error_msg = str(e)
             logger.error(f"Attempt {attempt + 1} failed: {error_msg}")
             if "rate_limit" in error_msg.lower() or "429" in error_msg:
                 if attempt < max_retries - 1:
-                    time.sleep((attempt + 1) * 2)
+                    cooperative_sleep((attempt + 1) * 2)
                     continue
                 return "Error: Rate limit exceeded. Please try later."
             elif "api_key" in error_msg.lower() or "401" in error_msg:
                 return "Error: Invalid API key. Please check Groq API configuration."
-            elif "connection" in error_msg.lower() or "timeout" in error_msg.lower():
+            elif "connection" in error_msg.lower() or "timeout" in error_msg.lower() or "timed out" in error_msg.lower():
                 if attempt < max_retries - 1:
-                    time.sleep(1)
+                    cooperative_sleep(1)
                     continue
                 return "Error: Network connection issue. Please check your internet."
             elif attempt == max_retries - 1:
                 return f"Error: Failed to generate project idea after {max_retries} attempts."
             else:
-                time.sleep(1)
+                cooperative_sleep(1)
     
     return "Error: Unable to generate idea."
 
+def stream_project_idea(messages, max_retries=3, use_cache=True):
+    '''Stream a project idea from the Groq API, yielding text chunks as they arrive'''
+    if not os.getenv("GROQ_API_KEY"):
+        logger.error("GROQ_API_KEY not found in environment variables")
+        yield "Error: GROQ_API_KEY not found in environment variables"
+        return
+
+    if use_prompt_cache(messages, use_cache):
+        yield from _stream_through_cache(messages, max_retries)
+        return
+
+    messages = with_system_prompt(messages)
+
+    for attempt in range(max_retries):
+        if attempt:
+            LLM_RETRIES.inc(kind="stream")
+        started = False
+        call_started = None
+        try:
+            # stream_completion() holds a slot for as long as each upstream connection is open
+            call_started = time.perf_counter()
+            for token in llm.stream_completion(messages, kind="stream", **GENERATION_PARAMS):
+                if not started:
+                    LLM_FIRST_TOKEN.observe(time.perf_counter() - call_started)
+                started = True
+                yield token
+            LLM_LATENCY.observe(time.perf_counter() - call_started, kind="stream", outcome="ok")
+
+            if started:
+                logger.info("Successfully streamed project idea/response")
+            else:
+                logger.warning("Empty response from Groq API")
+                yield "Error: Empty response from AI"
+            return
+        except LLMBusyError as e:
+            LLM_ERRORS.inc(kind="stream", error_class=type(e).__name__)
+            logger.warning(f"LLM client busy: {e}")
+            yield "Error: The AI service is busy. Please try again in a moment."
+            return
+        except Exception as e:
+            LLM_ERRORS.inc(kind="stream", error_class=type(e).__name__)
+            if call_started is not None:
+                LLM_LATENCY.observe(time.perf_counter() - call_started, kind="stream", outcome="error")
+            error_msg = str(e)
+            logger.error(f"Streaming attempt {attempt + 1} failed: {error_msg}")
+            # Once tokens have reached the client a retry would duplicate them
+            if started:
+                yield "\n\nError: The response was interrupted. Please try again."
+                return
+            if "rate_limit" in error_msg.lower() or "429" in error_msg:
+                if attempt < max_retries - 1:
+                    cooperative_sleep((attempt + 1) * 2)
+                    continue
+                yield "Error: Rate limit exceeded. Please try later."
+                return
+            elif "api_key" in error_msg.lower() or "401" in error_msg:
+                yield "Error: Invalid API key. Please check Groq API configuration."
+                return
+            elif "connection" in error_msg.lower() or "timeout" in error_msg.lower() or "timed out" in error_msg.lower():
+                if attempt < max_retries - 1:
+                    cooperative_sleep(1)
+                    continue
+                yield "Error: Network connection issue. Please check your internet."
+                return
+            elif attempt == max_retries - 1:
+                yield f"Error: Failed to generate project idea after {max_retries} attempts."
+                return
+            else:
+                cooperative_sleep(1)
+
+    yield "Error: Unable to generate idea."
+
+def _stream_through_cache(messages, max_retries):
+    '''Serve a cached first-turn reply in one chunk, or stream it and cache the result'''
+    key = prompt_cache.key_for(with_system_prompt(messages), {"model": MODEL, **GENERATION_PARAMS})
+    cached = prompt_cache.lookup(key)
+    if cached is not None:
+        yield cached
+        return
+
+    if not prompt_cache.claim(key):
+        cached = prompt_cache.wait(key)
+        if cached is not None:
+            yield cached
+        else:
+            yield from stream_project_idea(messages, max_retries, use_cache=False)
+        return
+
+    parts = []
+    try:
+        for token in stream_project_idea(messages, max_retries, use_cache=False):
+            parts.append(token)
+            yield token
+        reply = "".join(parts).strip()
+        if is_cacheable_reply(reply):
+            prompt_cache.store(key, reply)
+    finally:
+        prompt_cache.release(key)
+
+SUMMARY_PROMPT = {
+    "role": "system",
+    "content": (
+        "You maintain a running summary of a mentoring conversation about a coding project. "
+        "Merge the existing summary with the new messages. Keep the project title, chosen tech stack, "
+        "decisions made, and open questions. Reply with the updated summary only, in under 200 words."
+    )
+}
+
+def estimate_tokens(text):
+    '''Rough token count (about four characters per token) for budgeting prompts'''
+    return len(text) // 4 + 4
+
+def summarize_conversation(previous_summary, messages):
+    '''Fold older messages into the rolling summary; returns None if the model call fails'''
+    transcript = "\n".join(f"{m['role']}: {m['content']}" for m in messages)
+    prompt = [
+        SUMMARY_PROMPT,
+        {"role": "user", "content": f"Existing summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}"}
+    ]
+    try:
+        with llm.slot() as client:
+            call_started = time.perf_counter()
+            response = client.chat.completions.create(
+                model=MODEL,
+                messages=prompt,
+                max_tokens=300,
+                temperature=0.3,
+                stream=False
+            )
+        LLM_LATENCY.observe(time.perf_counter() - call_started, kind="summary", outcome="ok")
+        record_llm_usage("summary", getattr(response, "usage", None))
+        if response and response.choices:
+            return response.choices[0].message.content.strip() or None
+    except Exception as e:
+        LLM_ERRORS.inc(kind="summary", error_class=type(e).__name__)
+        logger.warning(f"Conversation summary failed: {e}")
+    return None
+
 def login_required(f):
     '''Decorator to require login for routes'''
     @wraps(f)